@@ -0,0 +1,154 @@
+import hashlib
+import json
+import time
+from threading import Lock, local
+
+from django.core.cache import cache
+from django.db import transaction
+
+from foodgram.settings import GENERATION_SNAPSHOT_MAX_AGE
+
+GENERATION_KEY = 'generation:{}'
+STATS_KEY = 'stats:{}:{}'
+
+
+def _initial_generation():
+    # Начальное значение зависит от времени: после вытеснения счётчика
+    # из кэша старые ключи не совпадут с новыми.
+    return int(time.time() * 1000)
+
+
+def get_generation(scope):
+    """Текущее поколение данных для области кэширования."""
+    key = GENERATION_KEY.format(scope)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(*scopes):
+    """Сдвигает поколение, делая недействительными все ключи области.
+       Возвращает новое поколение последней области.
+    """
+    generation = None
+    for scope in scopes:
+        key = GENERATION_KEY.format(scope)
+        try:
+            generation = cache.incr(key)
+        except ValueError:
+            generation = _initial_generation()
+            cache.set(key, generation, None)
+    return generation
+
+
+_pending = local()
+
+
+def bump_generation_on_commit(*scopes):
+    """Сдвигает поколение после фиксации текущей транзакции.
+       Иначе параллельный запрос между сдвигом и фиксацией закэширует
+       старые данные под новым поколением. Области всех изменений
+       транзакции сдвигаются один раз.
+    """
+    if not hasattr(_pending, 'scopes'):
+        _pending.scopes = set()
+    _pending.scopes.update(scopes)
+    transaction.on_commit(_publish_generations)
+
+
+def _publish_generations():
+    scopes = getattr(_pending, 'scopes', None)
+    if not scopes:
+        return
+    _pending.scopes = set()
+    bump_generation(*sorted(scopes))
+
+
+def make_digest(*parts):
+    """Хэш произвольных сериализуемых в JSON частей."""
+    return hashlib.md5(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def make_cache_key(prefix, *parts):
+    """Короткий ключ кэша из произвольных сериализуемых частей."""
+    return f'{prefix}:{make_digest(*parts)}'
+
+
+def count_event(name, event):
+    """Увеличивает счётчик события (например, попаданий в кэш)."""
+    key = STATS_KEY.format(name, event)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def get_event_counts(name, *events):
+    """Счётчики событий по имени, отсутствующие считаются нулевыми."""
+    keys = {STATS_KEY.format(name, event): event for event in events}
+    counts = cache.get_many(keys)
+    return {event: counts.get(key, 0) for key, event in keys.items()}
+
+
+class GenerationSnapshot:
+    """Значение в памяти процесса, пересобираемое при смене поколения.
+       Поколение читается из общего кэша, поэтому изменения из других
+       процессов (воркеров, management-команд) тоже пересобирают значение.
+       Кроме того, значение живёт не дольше GENERATION_SNAPSHOT_MAX_AGE
+       секунд: так подхватываются изменения в обход сигналов.
+       Строится лениво при первом обращении; одновременные обращения
+       после изменения данных пересобирают его только один раз.
+        Args:
+            scope (str): Область кэширования, например `ingredients`.
+            build (callable): Функция без аргументов, строящая значение.
+    """
+
+    def __init__(self, scope, build, max_age=GENERATION_SNAPSHOT_MAX_AGE):
+        self.scope = scope
+        self.build = build
+        self.max_age = max_age
+        self.lock = Lock()
+        self.snapshot = None
+
+    def is_fresh(self, snapshot, generation):
+        return snapshot is not None and snapshot[0] == generation and (
+            time.monotonic() - snapshot[1] < self.max_age
+        )
+
+    def get(self):
+        generation = get_generation(self.scope)
+        snapshot = self.snapshot
+        if not self.is_fresh(snapshot, generation):
+            with self.lock:
+                snapshot = self.snapshot
+                if not self.is_fresh(snapshot, generation):
+                    snapshot = (generation, time.monotonic(), self.build())
+                    self.snapshot = snapshot
+        return snapshot[2]
+
+    def refresh(self, stale, min_age=0):
+        """Пересобирает значение, в котором не хватило данных: например,
+           объекты созданы через bulk_create без сигналов. Одновременные
+           вызовы с одним устаревшим значением пересобирают его один раз,
+           а значение моложе `min_age` секунд не пересобирается.
+            Args:
+                stale: Значение, полученное из `get()`.
+                min_age (float): Минимальный возраст значения, секунды.
+        """
+        with self.lock:
+            snapshot = self.snapshot
+            if snapshot is not None and (
+                snapshot[2] is not stale
+                or time.monotonic() - snapshot[1] < min_age
+            ):
+                return snapshot[2]
+            # Поколение читается до данных, как и в get().
+            generation = get_generation(self.scope)
+            snapshot = (generation, time.monotonic(), self.build())
+            self.snapshot = snapshot
+        return snapshot[2]
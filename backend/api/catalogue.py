@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+from io import BytesIO
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from api.caches import GenerationSnapshot
+from api.renderers import ORJSONRenderer
+from api.serializers import IngredientSerializer
+from foodgram.settings import INGREDIENT_CATALOGUE_MAX_AGE
+from recipes.models import Ingredient
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Кодировки в порядке предпочтения: от меньшего ответа к большему.
+ENCODINGS = ('br', 'gzip')
+
+
+def compress_gzip(body):
+    # mtime=0: все процессы отдают под одним ETag одинаковые байты.
+    output = BytesIO()
+    with gzip.GzipFile(fileobj=output, mode='wb', mtime=0) as file:
+        file.write(body)
+    return output.getvalue()
+
+
+class Catalogue:
+    """Готовое тело ответа со всеми ингредиентами в нескольких кодировках.
+        Attributes:
+            bodies (dict): Кодировка -> байты, `identity` - без сжатия.
+            digest (str): Хэш несжатого тела для ETag.
+    """
+
+    def __init__(self, body):
+        self.bodies = {'identity': body, 'gzip': compress_gzip(body)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body)
+        self.digest = hashlib.md5(body).hexdigest()
+
+    def get_etag(self, encoding):
+        return f'"{self.digest}-{encoding}"'
+
+
+def build_catalogue():
+    data = IngredientSerializer(Ingredient.objects.all(), many=True).data
+    return Catalogue(ORJSONRenderer().render(data))
+
+
+catalogue = GenerationSnapshot('ingredients', build_catalogue)
+
+
+def select_encoding(accept_encoding, available):
+    """Выбирает сжатие из заголовка Accept-Encoding.
+       Среди разрешённых клиентом (q > 0) берётся первая
+       кодировка из ENCODINGS, иначе тело отдаётся без сжатия.
+    """
+    accepted = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        try:
+            quality = float(params.strip().partition('q=')[2] or 1)
+        except ValueError:
+            continue
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    for encoding in ENCODINGS:
+        if encoding in available and (encoding in accepted or '*' in accepted):
+            return encoding
+    return 'identity'
+
+
+def catalogue_response(request):
+    """Ответ со всем каталогом ингредиентов без сериализации.
+       Тело и его сжатые варианты строятся один раз на поколение
+       `ingredients`; ETag различается по кодировке.
+    """
+    current = catalogue.get()
+    encoding = select_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''), current.bodies
+    )
+    etag = current.get_etag(encoding)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(
+            current.bodies[encoding], content_type='application/json'
+        )
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = (
+        f'public, max-age={INGREDIENT_CATALOGUE_MAX_AGE}'
+    )
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
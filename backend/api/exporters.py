@@ -0,0 +1,277 @@
+import csv
+import os
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from itertools import islice
+from tempfile import NamedTemporaryFile
+from threading import Lock
+
+from django.http import FileResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+from api.caches import get_generation, make_digest
+from foodgram.settings import (SHOPPING_LIST_CHUNK_SIZE,
+                               SHOPPING_LIST_PDF_CACHE_DIR,
+                               SHOPPING_LIST_PDF_FONT,
+                               SHOPPING_LIST_PDF_WORKERS, )
+
+SHOPPING_LIST_TITLE = 'Купить в магазине:'
+
+# PDF рисуется вне потока запроса, одновременно - не больше
+# SHOPPING_LIST_PDF_WORKERS файлов.
+pdf_executor = ThreadPoolExecutor(
+    max_workers=SHOPPING_LIST_PDF_WORKERS,
+    thread_name_prefix='pdf',
+)
+
+EXPORTERS = {}
+
+
+def register_exporter(exporter):
+    """Добавляет формат в реестр выгрузки списка покупок."""
+    EXPORTERS[exporter.format] = exporter
+    return exporter
+
+
+def get_export_renderers():
+    """Форматы выгрузки в порядке регистрации, первый - по умолчанию."""
+    return list(EXPORTERS.values())
+
+
+def get_exporter(export_format):
+    return EXPORTERS[export_format]()
+
+
+class ExportContentNegotiation(DefaultContentNegotiation):
+    """Выбирает формат по `?format=`, затем по Accept.
+       Если Accept не совпал ни с одним форматом, отдаётся формат
+       по умолчанию, как и до появления других форматов.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
+
+
+class ShoppingListExporter(BaseRenderer, metaclass=ABCMeta):
+    """Формат выгрузки списка покупок.
+       Является рендерером DRF, чтобы формат выбирался стандартным
+       согласованием. Файл строит метод `export` из строк запроса
+       с полями `ingredient__name`, `ingredient__measurement_unit`
+       и `amount`.
+    """
+    filename = 'shopping_list'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Рендерер используется только для ответов с ошибками.
+        if isinstance(data, dict):
+            data = data.get('detail', data)
+        return str(data).encode()
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+    @abstractmethod
+    def export(self, ingredients, user):
+        """HTTP-ответ с файлом списка покупок пользователя."""
+
+
+class StreamingExporter(ShoppingListExporter):
+    """Текстовый формат, отдаваемый потоком пачками строк.
+       Строки читаются курсором, поэтому в памяти одновременно
+       находится только одна пачка.
+    """
+
+    def export(self, ingredients, user):
+        response = StreamingHttpResponse(
+            self.iter_content(ingredients), content_type=self.media_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{self.get_filename()}"'
+        )
+        return response
+
+    def iter_content(self, ingredients):
+        yield self.get_header()
+        rows = ingredients.iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+        while True:
+            chunk = ''.join(
+                self.format_row(ingredient)
+                for ingredient in islice(rows, SHOPPING_LIST_CHUNK_SIZE)
+            )
+            if not chunk:
+                return
+            yield chunk
+
+    @abstractmethod
+    def get_header(self):
+        """Начало файла перед строками списка."""
+
+    @abstractmethod
+    def format_row(self, ingredient):
+        """Строка файла для одного ингредиента."""
+
+
+@register_exporter
+class TextExporter(StreamingExporter):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def get_header(self):
+        return SHOPPING_LIST_TITLE
+
+    def format_row(self, ingredient):
+        return (
+            f"\n{ingredient['ingredient__name']} "
+            f"({ingredient['ingredient__measurement_unit']}) - "
+            f"{ingredient['amount']}"
+        )
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+@register_exporter
+class CsvExporter(StreamingExporter):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def get_header(self):
+        # BOM нужен Excel, чтобы прочитать файл как UTF-8.
+        return '\ufeff' + self.writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        )
+
+    def format_row(self, ingredient):
+        return self.writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+@register_exporter
+class PdfExporter(ShoppingListExporter):
+    """PDF строится в пуле потоков pdf_executor и кэшируется на диске.
+       Имя файла содержит поколение корзины пользователя, поэтому
+       повторная выгрузка неизменённой корзины отдаётся готовым файлом
+       без чтения списка из базы. Поколение корзины сдвигается и при
+       изменении состава её рецептов (api.signals), а правка чужих
+       рецептов файлы пользователя не затрагивает.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingList'
+    font_size = 12
+    title_size = 16
+    margin = 50
+    line_height = 18
+
+    font_lock = Lock()
+
+    def export(self, ingredients, user):
+        # Поколение читается до списка: изменение во время построения
+        # сдвинет его, и следующая выгрузка построит файл заново.
+        generation = get_generation(f'carts:{user.id}')
+        path = os.path.join(
+            SHOPPING_LIST_PDF_CACHE_DIR,
+            f'{user.id}-{make_digest(user.id, generation)}.pdf',
+        )
+        try:
+            pdf = self.open_pdf(path)
+        except FileNotFoundError:
+            # Файла нет или его только что удалил remove_stale
+            # параллельного запроса.
+            pdf = pdf_executor.submit(
+                self.write_pdf, list(ingredients), path
+            ).result()
+            self.remove_stale(user, path)
+        response = FileResponse(
+            pdf,
+            as_attachment=True,
+            filename=self.get_filename(),
+            content_type=self.media_type,
+        )
+        response['Content-Length'] = os.fstat(pdf.fileno()).st_size
+        return response
+
+    @staticmethod
+    def open_pdf(path):
+        """Открывает файл по дескриптору: у такого файла нет пути,
+           и FileResponse не обращается к файлу в кэше, который может
+           быть удалён параллельным запросом.
+        """
+        return open(os.open(path, os.O_RDONLY), 'rb')
+
+    @staticmethod
+    def remove_stale(user, path):
+        """Удаляет файлы прежних версий списка пользователя."""
+        pattern = os.path.join(SHOPPING_LIST_PDF_CACHE_DIR, f'{user.id}-*.pdf')
+        for stale in glob(pattern):
+            if stale != path:
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+    def register_font(self):
+        with self.font_lock:
+            if self.font_name not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(
+                    TTFont(self.font_name, SHOPPING_LIST_PDF_FONT)
+                )
+
+    def write_pdf(self, rows, path):
+        """Пишет PDF во временный файл и атомарно переносит его в кэш.
+           Возвращает файл, открытый до переноса: его можно отдать,
+           даже если файл в кэше тут же удалят.
+        """
+        self.register_font()
+        os.makedirs(SHOPPING_LIST_PDF_CACHE_DIR, exist_ok=True)
+        with NamedTemporaryFile(
+            dir=SHOPPING_LIST_PDF_CACHE_DIR, suffix='.tmp', delete=False
+        ) as output:
+            self.draw(output, rows)
+        pdf = self.open_pdf(output.name)
+        os.replace(output.name, path)
+        return pdf
+
+    def draw(self, output, rows):
+        _, height = A4
+        document = canvas.Canvas(output, pagesize=A4)
+        document.setTitle(SHOPPING_LIST_TITLE)
+        document.setFont(self.font_name, self.title_size)
+        document.drawString(self.margin, height - self.margin,
+                            SHOPPING_LIST_TITLE)
+        document.setFont(self.font_name, self.font_size)
+        y = height - self.margin - self.line_height * 2
+        for ingredient in rows:
+            if y < self.margin:
+                document.showPage()
+                document.setFont(self.font_name, self.font_size)
+                y = height - self.margin
+            document.drawString(
+                self.margin, y,
+                f"{ingredient['ingredient__name']} "
+                f"({ingredient['ingredient__measurement_unit']}) - "
+                f"{ingredient['amount']}"
+            )
+            y -= self.line_height
+        document.save()
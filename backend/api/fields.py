@@ -0,0 +1,244 @@
+import base64
+import binascii
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps, JpegImagePlugin, UnidentifiedImageError
+from rest_framework import serializers
+
+from foodgram.settings import (IMAGE_PROCESSING_WORKERS, MAX_IMAGE_SIDE,
+                               MAX_IMAGE_SIZE, THUMBNAIL_FORMATS,
+                               THUMBNAIL_VARIANTS, )
+from api.tags import tag_cache
+from recipes.models import Tag
+from recipes.thumbnails import (get_storage, get_thumbnail_name,
+                                get_thumbnails_version, thumbnail_storage, )
+
+# Размер части base64-строки, декодируемой за один шаг (кратен 4).
+DECODE_CHUNK_SIZE = 64 * 1024
+# Сколько байт держать в памяти, прежде чем перенести файл на диск.
+SPOOL_MAX_MEMORY = 512 * 1024
+# Форматы, которые пересохраняем: анимированный GIF потерял бы кадры.
+REENCODED_FORMATS = ('JPEG', 'PNG')
+EXIF_ORIENTATION = 0x0112
+IMAGE_VARIANT_QUERY_PARAM = 'image_size'
+IMAGE_FORMAT_QUERY_PARAM = 'image_format'
+
+image_executor = ThreadPoolExecutor(
+    max_workers=IMAGE_PROCESSING_WORKERS,
+    thread_name_prefix='image',
+)
+
+
+def decode_base64(data, max_size):
+    """Декодирует base64-строку частями во временный файл.
+        Args:
+            data (str): Строка base64 без заголовка data URI.
+            max_size (int): Допустимый размер результата в байтах.
+        Returns:
+            SpooledTemporaryFile: Файл с декодированными данными.
+    """
+    output = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    carry = ''
+    size = 0
+    try:
+        for start in range(0, len(data), DECODE_CHUNK_SIZE):
+            chunk = carry + ''.join(
+                data[start:start + DECODE_CHUNK_SIZE].split()
+            )
+            aligned = len(chunk) - len(chunk) % 4
+            carry = chunk[aligned:]
+            decoded = base64.b64decode(chunk[:aligned], validate=True)
+            size += len(decoded)
+            if size > max_size:
+                raise ValidationError(
+                    f'Размер изображения превышает {max_size} байт.'
+                )
+            output.write(decoded)
+        if carry:
+            raise binascii.Error('Incorrect padding')
+    except (binascii.Error, ValueError):
+        output.close()
+        raise ValidationError(Base64ImageField.INVALID_FILE_MESSAGE)
+    except ValidationError:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+def get_save_options(image):
+    """Параметры сохранения, сохраняющие качество исходного JPEG:
+       его таблицы квантования и прореживание цвета.
+    """
+    if image.format != 'JPEG':
+        return {}
+    return {
+        'qtables': image.quantization,
+        'subsampling': JpegImagePlugin.get_sampling(image),
+    }
+
+
+def process_image(upload, allowed_types):
+    """Проверяет изображение и пересохраняет его без метаданных.
+       Размеры читаются из заголовка до распаковки пикселей, поэтому
+       слишком большое изображение отклоняется без выделения памяти.
+       Поворот из EXIF применяется к пикселям, так как сам EXIF
+       удаляется. JPEG без поворота пересохраняется с качеством
+       исходного файла (`quality='keep'`).
+        Returns:
+            tuple: Файл с изображением и его расширение.
+    """
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            if max(image.size) > MAX_IMAGE_SIDE:
+                raise ValidationError(
+                    f'Сторона изображения превышает {MAX_IMAGE_SIDE} пикселей.'
+                )
+            image.verify()
+        extension = image_format.lower()
+        if extension not in allowed_types:
+            raise ValidationError(Base64ImageField.INVALID_TYPE_MESSAGE)
+        if image_format not in REENCODED_FORMATS:
+            upload.seek(0)
+            return upload, extension
+        upload.seek(0)
+        output = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        with Image.open(upload) as image:
+            if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+                options = get_save_options(image)
+                ImageOps.exif_transpose(image).save(
+                    output, format=image_format, **options
+                )
+            elif image_format == 'JPEG':
+                image.save(output, format=image_format, quality='keep')
+            else:
+                image.save(output, format=image_format)
+        upload.close()
+        output.seek(0)
+        return output, extension
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ValidationError(Base64ImageField.INVALID_FILE_MESSAGE)
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    """Изображение в base64 или файлом multipart-формы.
+       Размер проверяется по длине строки ещё до декодирования, строка
+       декодируется частями во временный файл, а проверка и пересохранение
+       изображения выполняются в ограниченном пуле потоков.
+    """
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if isinstance(base64_data, UploadedFile):
+            return self.file_to_internal_value(base64_data)
+        if not isinstance(base64_data, str):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        base64_data = base64_data.split(';base64,', 1)[-1]
+        if len(base64_data) // 4 * 3 > MAX_IMAGE_SIZE:
+            raise ValidationError(
+                f'Размер изображения превышает {MAX_IMAGE_SIZE} байт.'
+            )
+        upload = decode_base64(base64_data, MAX_IMAGE_SIZE)
+        try:
+            image, extension = image_executor.submit(
+                process_image, upload, self.ALLOWED_TYPES
+            ).result()
+        except ValidationError:
+            upload.close()
+            raise
+        return File(image, name=f'{uuid.uuid4()}.{extension}')
+
+    def file_to_internal_value(self, upload):
+        """Принимает изображение, загруженное файлом multipart-формы.
+           Django уже записал файл на диск обработчиком загрузки,
+           остаётся проверить его так же, как декодированный base64.
+        """
+        if upload.size > MAX_IMAGE_SIZE:
+            raise ValidationError(
+                f'Размер изображения превышает {MAX_IMAGE_SIZE} байт.'
+            )
+        image, extension = image_executor.submit(
+            process_image, upload, self.ALLOWED_TYPES
+        ).result()
+        return File(image, name=f'{uuid.uuid4()}.{extension}')
+
+
+def get_image_url(name, thumbnails_version, context, default_variant=None):
+    """URL изображения рецепта или его уменьшенной копии.
+       Вариант берётся из `?image_size=`, затем из `image_variant`
+       в контексте сериализатора, затем из `default_variant`.
+       Формат копии задаётся `?image_format=webp`. Пока копии
+       не созданы, отдаётся оригинал; готовность читается из рецепта,
+       хранилище не опрашивается.
+        Args:
+            name (str): Имя оригинала в хранилище.
+            thumbnails_version (str): Версия готовых копий рецепта.
+            context (dict): Контекст сериализатора.
+            default_variant (str): Вариант по умолчанию для поля.
+    """
+    if not name:
+        return None
+    request = context.get('request')
+    variant = context.get('image_variant') or default_variant
+    image_format = THUMBNAIL_FORMATS[0]
+    if request is not None:
+        variant = request.query_params.get(IMAGE_VARIANT_QUERY_PARAM, variant)
+        requested_format = request.query_params.get(
+            IMAGE_FORMAT_QUERY_PARAM, ''
+        ).upper()
+        if requested_format in THUMBNAIL_FORMATS:
+            image_format = requested_format
+    if variant in THUMBNAIL_VARIANTS and (
+        thumbnails_version == get_thumbnails_version(name)
+    ):
+        url = thumbnail_storage.url(
+            get_thumbnail_name(name, variant, image_format)
+        )
+    else:
+        url = get_storage().url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class ImageVariantField(serializers.ImageField):
+    """Ссылка на изображение рецепта нужного размера (только чтение).
+       Получает рецепт целиком: готовность копий хранится в нём.
+    """
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs['read_only'] = True
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return get_image_url(
+            recipe.image.name if recipe.image else None,
+            recipe.thumbnails_version, self.context, self.variant,
+        )
+
+
+class CachedTagField(serializers.PrimaryKeyRelatedField):
+    """Тэг по id, проверяемый по кэшу тэгов без запроса к базе."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = tag_cache.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return Tag.from_db(
+            self.get_queryset().db, tuple(tag), tuple(tag.values())
+        )
@@ -1,11 +1,40 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
+from rest_framework.pagination import _positive_int
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.search import ingredient_index
+from api.tags import get_tag_slug_choices, tag_cache
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+from recipes.search import search_recipes
 
 
 class IngredientFilter(SearchFilter):
+    """Поиск ингредиентов по `?name=` через индекс в памяти.
+       Для списка возвращает уже отсортированные строки индекса:
+       сначала совпадения по началу названия, затем по подстроке.
+       `?fuzzy=1` ищет похожие названия с учётом опечаток.
+       `?limit=` ограничивает число результатов.
+    """
     search_param = 'name'
+    limit_param = 'limit'
+    fuzzy_param = 'fuzzy'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query or getattr(view, 'action', None) != 'list':
+            return super().filter_queryset(request, queryset, view)
+        try:
+            limit = _positive_int(
+                request.query_params[self.limit_param], strict=True
+            )
+        except (KeyError, ValueError):
+            limit = None
+        if request.query_params.get(self.fuzzy_param, '').lower() in (
+                '1', 'true'
+        ):
+            return ingredient_index.fuzzy_search(query, limit)
+        return ingredient_index.search(query, limit)
 
     class Meta:
         model = Ingredient
@@ -13,19 +42,89 @@ class IngredientFilter(SearchFilter):
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        field_name='tags',
+        choices=get_tag_slug_choices,
+        method='filter_tags',
     )
     is_favorited = filters.NumberFilter(method='filter')
     is_in_shopping_cart = filters.NumberFilter(
         method='filter'
     )
+    search = filters.CharFilter(method='filter_search')
+    ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        method='filter_ingredients',
+    )
+    exclude_ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(),
+        method='filter_exclude_ingredients',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',)
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ingredients', 'exclude_ingredients',)
+
+    flag_params = ('is_favorited', 'is_in_shopping_cart')
+
+    @classmethod
+    def get_cache_params(cls, query_params):
+        """Приводит параметры фильтрации к каноническому виду для ключей
+           кэша: порядок и повторы тэгов, а также запись флагов
+           не влияют на результат.
+        """
+        params = {
+            'tags': sorted(set(query_params.getlist('tags'))),
+            'author': query_params.get('author', ''),
+            'search': query_params.get('search', '').strip(),
+            'ingredients': sorted(set(query_params.getlist('ingredients'))),
+            'exclude_ingredients': sorted(
+                set(query_params.getlist('exclude_ingredients'))
+            ),
+        }
+        for name in cls.flag_params:
+            try:
+                params[name] = bool(float(query_params.get(name) or 0))
+            except ValueError:
+                params[name] = query_params.get(name)
+        return params
+
+    def filter_tags(self, queryset, name, slugs):
+        """Слаги проверяются и переводятся в id по кэшу тэгов,
+           поэтому фильтр не обращается к таблице тэгов.
+        """
+        return queryset.filter(
+            **{f'{name}__in': tag_cache.get_ids(slugs)}
+        ).distinct()
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, описанию и ингредиентам.
+           Результаты упорядочены по релевантности.
+        """
+        return search_recipes(queryset, value)
+
+    def filter_ingredients(self, queryset, name, ingredients):
+        """Рецепты, в которых есть все указанные ингредиенты.
+           Каждый ингредиент - полусоединение `id IN (...)`, которое
+           читает индекс (ingredient, recipe) и не размножает строки
+           рецептов, в отличие от соединения.
+        """
+        for ingredient in ingredients:
+            queryset = queryset.filter(pk__in=IngredientRecipe.objects.filter(
+                ingredient=ingredient
+            ).values('recipe_id'))
+        return queryset
+
+    def filter_exclude_ingredients(self, queryset, name, ingredients):
+        """Рецепты без единого из указанных ингредиентов:
+           антисоединение NOT EXISTS по индексу (ingredient, recipe).
+        """
+        if not ingredients:
+            return queryset
+        return queryset.filter(~Exists(IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk'), ingredient__in=ingredients
+        )))
 
     def filter(self, queryset, name, value):
         if (
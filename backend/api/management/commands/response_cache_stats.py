@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from api.caches import get_event_counts
+
+CACHED_VIEWSETS = ('recipes', 'tags', 'ingredients')
+
+
+class Command(BaseCommand):
+    help = 'Показать попадания и промахи кэша ответов'
+
+    def handle(self, *args, **kwargs):
+        for name in CACHED_VIEWSETS:
+            counts = get_event_counts(name, 'hit', 'miss')
+            total = counts['hit'] + counts['miss']
+            ratio = counts['hit'] / total if total else 0
+            self.stdout.write(
+                f'{name}: попаданий {counts["hit"]}, '
+                f'промахов {counts["miss"]}, доля попаданий {ratio:.1%}'
+            )
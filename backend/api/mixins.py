@@ -1,7 +1,17 @@
+from calendar import timegm
+
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date
 from rest_framework import status
 from rest_framework.response import Response
 
+from api.caches import (count_event, get_generation, make_cache_key,
+                        make_digest, )
+from api.pagination import KeysetPagination
+from api.viewer import get_viewer_context
+from foodgram.settings import RESPONSE_CACHE_TIMEOUT
 from recipes.models import Favorite
 
 
@@ -27,6 +37,7 @@ class SubscribeStatusViewSetMixin:
                 instance, created = target_subscribe.objects.get_or_create(
                     user=request.user, author=obj
                 )
+                get_viewer_context(request).reset()
                 serializer = type_serializer(obj, data=request.data,
                                              context={'request': request})
                 serializer.is_valid(raise_exception=True)
@@ -47,5 +58,159 @@ class SubscribeStatusViewSetMixin:
                     user=request.user,
                     author=obj
                 ).delete()
+            get_viewer_context(request).reset()
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_404_NOT_FOUND)
+
+
+class KeysetPaginationViewSetMixin:
+    """Переключает вьюсет на пагинацию по курсору.
+       Без параметра `cursor` работает обычная постраничная пагинация.
+    """
+    keyset_ordering = ('-id',)
+
+    @property
+    def paginator(self):
+        if (
+                not hasattr(self, '_paginator')
+                and self.pagination_class is not None
+                and KeysetPagination.cursor_query_param
+                in self.request.query_params
+        ):
+            self._paginator = KeysetPagination(self.keyset_ordering)
+        return super().paginator
+
+
+class AnonymousResponseCacheMixin:
+    """Кэширует ответы list и retrieve для анонимных пользователей.
+       Ключ строится из пути и нормализованной строки запроса,
+       а также поколений областей `response_cache_scopes`: изменение
+       данных сдвигает поколение и старые ответы больше не находятся.
+       Вместе с телом хранятся валидаторы ответа (ETag, Last-Modified),
+       поэтому при попадании условный запрос получает 304 без обращения
+       к базе. Попадания и промахи видны в заголовке X-Cache и в счётчиках.
+    """
+    response_cache_scopes = ()
+    response_cache_timeout = RESPONSE_CACHE_TIMEOUT
+    cached_headers = ('ETag', 'Last-Modified', 'Vary')
+
+    def get_response_cache_key(self, request):
+        query = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+        )
+        generations = [
+            get_generation(scope) for scope in self.response_cache_scopes
+        ]
+        return make_cache_key(
+            'response', generations, request.get_host(), request.path, query
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            count_event(self.basename, 'hit')
+            data, headers = cached
+            last_modified = headers.get('Last-Modified')
+            response = get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=last_modified and parse_http_date(last_modified),
+            ) or Response(data)
+            for name, value in headers.items():
+                response[name] = value
+            response['X-Cache'] = 'HIT'
+            return response
+        count_event(self.basename, 'miss')
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {
+                name: response[name] for name in self.cached_headers
+                if response.has_header(name)
+            }
+            cache.set(
+                key, (response.data, headers), self.response_cache_timeout
+            )
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ConditionalGetViewSetMixin:
+    """Поддержка условных GET-запросов для list и retrieve.
+       Вьюсет возвращает валидаторы методами `get_list_validators(page)`
+       и `get_object_validators()`: части ETag и время изменения (или None).
+       Валидаторы списка строятся по строкам уже выбранной страницы,
+       отдельного запроса по всему отфильтрованному набору нет.
+       Если валидаторы совпали с If-None-Match или If-Modified-Since,
+       отвечаем 304 без сериализации тела ответа.
+       В цепочке наследования стоит после кэша ответов, чтобы при
+       попадании в кэш валидаторы не вычислялись.
+    """
+
+    def get_list_validators(self, page):
+        return None
+
+    def get_object_validators(self):
+        return None
+
+    def get_page_state(self):
+        """Общее количество и ссылки пагинатора для ETag страницы."""
+        paginator = self.paginator
+        page = getattr(paginator, 'page', None)
+        return (
+            getattr(getattr(page, 'paginator', None), 'count', None),
+            paginator.get_next_link(),
+            paginator.get_previous_link(),
+        )
+
+    def conditional_response(self, validators, handler, request, *args,
+                             **kwargs):
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag_parts, last_modified = validators
+        etag = f'W/"{make_digest(*etag_parts)}"'
+        timestamp = last_modified and timegm(last_modified.utctimetuple())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (
+                status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED
+        ):
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            self.get_list_validators(page), self.render_page,
+            request, page
+        )
+
+    def render_page(self, request, page):
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_object_validators(), super().retrieve,
+            request, *args, **kwargs
+        )
@@ -1,6 +1,254 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import partial
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram.settings import PAGINATION_COUNT_CACHE_TIMEOUT
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор, берущий общее количество объектов из кэша."""
+
+    def __init__(self, *args, count_cache_key=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_cache_key = count_cache_key
+
+    @cached_property
+    def count(self):
+        if self.count_cache_key is None:
+            return super().count
+        count = cache.get(self.count_cache_key)
+        if count is None:
+            count = super().count
+            cache.set(
+                self.count_cache_key, count, PAGINATION_COUNT_CACHE_TIMEOUT
+            )
+        return count
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация.
+       `?count=false` отключает подсчёт общего количества объектов.
+       Иначе количество берётся из кэша, если вьюсет умеет строить
+       для него ключ методом `get_count_cache_key`.
+    """
     page_size = 6
     page_size_query_param = 'limit'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.with_count = request.query_params.get(
+            self.count_query_param, ''
+        ).lower() not in ('false', '0')
+        if not self.with_count:
+            return self.paginate_without_count(queryset, request)
+        get_count_cache_key = getattr(view, 'get_count_cache_key', None)
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            count_cache_key=get_count_cache_key and get_count_cache_key(),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_without_count(self, queryset, request):
+        """Отдаёт страницу, запрашивая на одну запись больше вместо COUNT."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            self.page_number = _positive_int(page_number, strict=True)
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='Неверный номер страницы'
+            ))
+        offset = (self.page_number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(results) > page_size
+        self.request = request
+        return results[:page_size]
+
+    def get_next_link(self):
+        if self.with_count:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.page_query_param,
+            self.page_number + 1,
+        )
+
+    def get_previous_link(self):
+        if self.with_count:
+            return super().get_previous_link()
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.page_query_param, self.page_number - 1
+        )
+
+    def get_paginated_response(self, data):
+        if self.with_count:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу сортировки (курсору).
+       Не выполняет COUNT и не использует OFFSET, поэтому время ответа
+       не зависит от глубины страницы. Курсор кодирует значения полей
+       сортировки крайней записи и не сдвигается при добавлении новых.
+       Включается параметром `cursor`, первая страница - `?cursor=`.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-id',)
+    invalid_cursor_message = 'Неверный курсор'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        if position is not None:
+            position = self.parse_position(queryset.model, position)
+        ordering = self.get_ordering(reverse)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(
+                ordering, position
+            ))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    @staticmethod
+    def get_seek_filter(ordering, position):
+        """Условие "строго после позиции" для составного ключа.
+           Для ключа (a, b) это a > x OR (a = x AND b > y).
+        """
+        seek = Q()
+        for index, field in enumerate(ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{
+                f'{field.lstrip("-")}__{lookup}': position[index]
+            })
+            for previous, value in zip(ordering[:index], position):
+                condition &= Q(**{previous.lstrip('-'): value})
+            seek |= condition
+        return seek
+
+    def get_position(self, instance):
+        if isinstance(instance, dict):
+            return [instance[field.lstrip('-')] for field in self.ordering]
+        return [
+            getattr(instance, field.lstrip('-')) for field in self.ordering
+        ]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            position, reverse = cursor['p'], bool(cursor['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+                len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def parse_position(self, model, position):
+        """Приводит значения курсора к типам полей сортировки.
+           Курсор приходит от клиента, поэтому значение неверного типа
+           даёт 404, а не ошибку при построении запроса.
+        """
+        try:
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, instance, reverse):
+        cursor = json.dumps(
+            {'p': self.get_position(instance), 'r': int(reverse)},
+            separators=(',', ':'),
+        )
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            urlsafe_b64encode(cursor.encode()).decode(),
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,276 @@
+import copy
+import time
+from itertools import chain
+from threading import Lock, local
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from api.caches import bump_generation, get_generation
+from foodgram.settings import (GENERATION_SNAPSHOT_MAX_AGE,
+                               PANTRY_CHANGES_TIMEOUT,
+                               PANTRY_INDEX_CHUNK_SIZE,
+                               PANTRY_INDEX_MAX_CHANGES, )
+from recipes.models import IngredientRecipe
+
+PANTRY_SCOPE = 'recipe_ingredients'
+PANTRY_CHANGES_KEY = 'pantry-changes:{}'
+
+
+class PantryState:
+    """Состав рецептов в виде инвертированного индекса.
+       `recipe_ids` и `sizes` - id рецептов и число их ингредиентов;
+       рецепты, содержащие ингредиент `i`, - это позиции
+       `postings[offsets[i]:offsets[i + 1]]` в `recipe_ids`.
+       Рецепты без ингредиентов в индекс не попадают.
+       Изменённые после сборки рецепты лежат поверх массивов:
+       `changes` - их новый состав (пустой - рецепт удалён),
+       `removed` - их старые позиции, которые не учитываются.
+        Args:
+            pairs (ndarray): Плоский массив пар (рецепт, ингредиент).
+            generation (int): Поколение состава рецептов при сборке.
+    """
+
+    def __init__(self, pairs, generation):
+        pairs = pairs.reshape(-1, 2)
+        self.recipe_ids, positions, self.sizes = np.unique(
+            pairs[:, 0], return_inverse=True, return_counts=True
+        )
+        ingredient_ids = pairs[:, 1]
+        order = np.argsort(ingredient_ids, kind='stable')
+        self.postings = positions.reshape(-1)[order].astype(np.int32)
+        self.offsets = np.zeros(
+            (int(ingredient_ids.max()) + 2) if len(pairs) else 1,
+            dtype=np.int64,
+        )
+        np.cumsum(np.bincount(ingredient_ids), out=self.offsets[1:])
+        self.generation = generation
+        self.built_at = time.monotonic()
+        self.changes = {}
+        self.removed = np.empty(0, dtype=np.int64)
+
+    def get_postings(self, ingredient_ids):
+        bound = len(self.offsets) - 1
+        return [
+            self.postings[self.offsets[i]:self.offsets[i + 1]]
+            for i in set(ingredient_ids) if 0 <= i < bound
+        ]
+
+    def get_pairs(self):
+        """Пары (рецепт, ингредиент) с учётом изменённых рецептов."""
+        ingredient_ids = np.repeat(
+            np.arange(len(self.offsets) - 1), np.diff(self.offsets)
+        )
+        keep = ~np.isin(self.postings, self.removed)
+        pairs = [
+            np.stack((
+                self.recipe_ids[self.postings[keep]], ingredient_ids[keep]
+            ), axis=1).reshape(-1),
+            np.fromiter(chain.from_iterable(
+                (recipe_id, ingredient_id)
+                for recipe_id, ingredients in self.changes.items()
+                for ingredient_id in ingredients
+            ), np.int64),
+        ]
+        return np.concatenate(pairs)
+
+    def apply(self, changes, generation):
+        """Новое состояние с заменённым составом рецептов `changes`.
+           Когда изменённых рецептов становится больше
+           PANTRY_INDEX_MAX_CHANGES, они сливаются в основные массивы.
+        """
+        state = copy.copy(self)
+        state.changes = {**self.changes, **changes}
+        state.generation = generation
+        if len(state.changes) > PANTRY_INDEX_MAX_CHANGES:
+            compacted = PantryState(state.get_pairs(), generation)
+            compacted.built_at = self.built_at
+            return compacted
+        changed_ids = np.fromiter(state.changes, np.int64)
+        positions = np.searchsorted(self.recipe_ids, changed_ids)
+        positions = positions[positions < len(self.recipe_ids)]
+        state.removed = positions[
+            np.isin(self.recipe_ids[positions], changed_ids)
+        ]
+        return state
+
+
+class PantryMatches:
+    """Подходящие рецепты, упорядоченные по числу недостающих
+       ингредиентов. Последовательность для пагинатора: строки
+       создаются только для запрошенного среза.
+    """
+
+    def __init__(self, recipe_ids, missing, matched):
+        self.recipe_ids = recipe_ids
+        self.missing = missing
+        self.matched = matched
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def __getitem__(self, index):
+        return [
+            {'id': int(recipe_id), 'missing': int(missing),
+             'matched': int(matched)}
+            for recipe_id, missing, matched in zip(
+                self.recipe_ids[index], self.missing[index],
+                self.matched[index],
+            )
+        ]
+
+
+class PantryIndex:
+    """Индекс "что приготовить из имеющихся продуктов".
+       Хранит состав всех рецептов в массивах numpy. При изменении
+       рецептов индекс не пересобирается: номера изменённых рецептов
+       пишутся в журнал в общем кэше, а каждый процесс дочитывает журнал
+       и загружает из базы состав только этих рецептов. Полная сборка
+       нужна при старте, при потере журнала и раз в
+       GENERATION_SNAPSHOT_MAX_AGE секунд. Запрос не ходит в базу:
+       списки рецептов с продуктами пользователя склеиваются,
+       и совпадения по рецептам считаются одним `bincount`.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.state = None
+        self.pending = local()
+
+    def build(self):
+        # Поколение читается до данных: изменения, сделанные во время
+        # сборки, будут применены повторно, что безопасно.
+        generation = get_generation(PANTRY_SCOPE)
+        # Порядок по рецепту отдаёт уникальный индекс (recipe, ingredient).
+        rows = IngredientRecipe.objects.order_by('recipe_id').values_list(
+            'recipe_id', 'ingredient_id'
+        ).iterator(chunk_size=PANTRY_INDEX_CHUNK_SIZE)
+        return PantryState(
+            np.fromiter(chain.from_iterable(rows), np.int64), generation
+        )
+
+    def load_changes(self, state, generation):
+        """Новый состав рецептов, изменённых после поколения `state`.
+           Возвращает None, если журнал неполон и индекс нужно собрать
+           заново.
+        """
+        if not 0 < generation - state.generation <= PANTRY_INDEX_MAX_CHANGES:
+            return None
+        keys = [
+            PANTRY_CHANGES_KEY.format(number)
+            for number in range(state.generation + 1, generation + 1)
+        ]
+        entries = cache.get_many(keys)
+        if len(entries) < len(keys):
+            return None
+        changes = {
+            recipe_id: set()
+            for recipe_id in chain.from_iterable(entries.values())
+        }
+        rows = IngredientRecipe.objects.filter(
+            recipe_id__in=changes
+        ).values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows:
+            changes[recipe_id].add(ingredient_id)
+        return {
+            recipe_id: frozenset(ingredients)
+            for recipe_id, ingredients in changes.items()
+        }
+
+    def is_fresh(self, state, generation):
+        return state is not None and state.generation == generation and (
+            time.monotonic() - state.built_at < GENERATION_SNAPSHOT_MAX_AGE
+        )
+
+    def get_state(self):
+        generation = get_generation(PANTRY_SCOPE)
+        state = self.state
+        if self.is_fresh(state, generation):
+            return state
+        with self.lock:
+            state = self.state
+            if self.is_fresh(state, generation):
+                return state
+            changes = None
+            if state is not None and (
+                time.monotonic() - state.built_at
+                < GENERATION_SNAPSHOT_MAX_AGE
+            ):
+                changes = self.load_changes(state, generation)
+            if changes is None:
+                state = self.build()
+            else:
+                state = state.apply(changes, generation)
+            self.state = state
+        return state
+
+    def record_change(self, recipe_id):
+        """Отмечает изменение состава рецепта. Журнал пишется после
+           фиксации транзакции, одной записью на все её рецепты.
+        """
+        if not hasattr(self.pending, 'recipe_ids'):
+            self.pending.recipe_ids = set()
+        self.pending.recipe_ids.add(recipe_id)
+        transaction.on_commit(self.publish_changes)
+
+    def publish_changes(self):
+        recipe_ids = getattr(self.pending, 'recipe_ids', None)
+        if not recipe_ids:
+            return
+        recipe_ids = sorted(recipe_ids)
+        self.pending.recipe_ids = set()
+        generation = bump_generation(PANTRY_SCOPE)
+        cache.set(
+            PANTRY_CHANGES_KEY.format(generation), recipe_ids,
+            PANTRY_CHANGES_TIMEOUT,
+        )
+
+    def match(self, ingredient_ids, max_missing=None):
+        """Рецепты, в которых есть хотя бы один из продуктов.
+           Сначала рецепты, которые можно приготовить полностью, затем
+           с одним недостающим ингредиентом и так далее; при равенстве -
+           с большим числом совпавших продуктов, затем новые.
+            Args:
+                ingredient_ids (list): id ингредиентов пользователя.
+                max_missing (int): Сколько ингредиентов может не хватать.
+            Returns:
+                PantryMatches: id рецептов с числом недостающих
+                и совпавших ингредиентов.
+        """
+        state = self.get_state()
+        products = set(ingredient_ids)
+        postings = state.get_postings(products)
+        # Читаются только списки рецептов с продуктами пользователя.
+        counts = np.bincount(
+            np.concatenate(postings) if postings
+            else np.empty(0, dtype=np.int32),
+            minlength=len(state.recipe_ids),
+        )
+        counts[state.removed] = 0
+        selected = np.flatnonzero(counts)
+        matched = counts[selected]
+        missing = state.sizes[selected] - matched
+        recipe_ids = state.recipe_ids[selected]
+        changed = [
+            (recipe_id, len(ingredients & products), len(ingredients))
+            for recipe_id, ingredients in state.changes.items()
+            if not ingredients.isdisjoint(products)
+        ]
+        if changed:
+            changed = np.array(changed, dtype=np.int64)
+            recipe_ids = np.concatenate((recipe_ids, changed[:, 0]))
+            matched = np.concatenate((matched, changed[:, 1]))
+            missing = np.concatenate((missing, changed[:, 2] - changed[:, 1]))
+        if max_missing is not None:
+            keep = missing <= max_missing
+            recipe_ids, matched, missing = (
+                recipe_ids[keep], matched[keep], missing[keep]
+            )
+        order = np.lexsort((-recipe_ids, -matched, missing))
+        return PantryMatches(
+            recipe_ids[order], missing[order], matched[order]
+        )
+
+
+pantry_index = PantryIndex()
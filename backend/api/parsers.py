@@ -0,0 +1,25 @@
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+
+class ORJSONParser(JSONParser):
+    """JSON-парсер на orjson."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'Ошибка разбора JSON - {exc}')
+
+
+class MessagePackParser(BaseParser):
+    """Парсер тела запроса в формате MessagePack."""
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'Ошибка разбора MessagePack - {exc}')
@@ -4,8 +4,8 @@ from rest_framework import permissions
 class IsAuthorOrAdminOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return (
-                obj.author == request.user
-                or request.method in permissions.SAFE_METHODS
+                request.method in permissions.SAFE_METHODS
+                or obj.author == request.user
                 or request.user.is_superuser
         )
 
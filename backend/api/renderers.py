@@ -0,0 +1,80 @@
+import math
+from decimal import Decimal
+
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Типы, которые не умеют кодировать orjson и msgpack (Decimal, ленивые
+# строки, datetime в формате DRF и т.п.), приводим так же, как DRF.
+encode_default = JSONEncoder().default
+
+
+def has_non_finite(data):
+    """Есть ли в данных NaN или бесконечность.
+       orjson пишет их как null, а DRF в строгом режиме отказывается
+       их кодировать. Строки, целые и None в стек не попадают:
+       их в ответах большинство.
+    """
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            values = value.values()
+        elif isinstance(value, (list, tuple)):
+            values = value
+        else:
+            if isinstance(value, (float, Decimal)) and (
+                not math.isfinite(value)
+            ):
+                return True
+            continue
+        for item in values:
+            kind = type(item)
+            if kind is str or kind is int or kind is bool or item is None:
+                continue
+            stack.append(item)
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSON-рендерер на orjson.
+       Формирует тот же JSON, что и стандартный рендерер DRF,
+       в несколько раз быстрее на больших ответах: так же экранирует
+       U+2028/U+2029 и так же не кодирует NaN и бесконечность
+       в строгом режиме (STRICT_JSON).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        content = orjson.dumps(data, default=encode_default, option=options)
+        # NaN и бесконечность orjson пишет как null: без null проверять
+        # данные не нужно.
+        if self.strict and b'null' in content and has_non_finite(data):
+            raise ValueError(
+                'Out of range float values are not JSON compliant'
+            )
+        # Разделители строк допустимы в JSON, но не в JavaScript.
+        if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+            content = content.replace(
+                b'\xe2\x80\xa8', b'\\u2028'
+            ).replace(b'\xe2\x80\xa9', b'\\u2029')
+        return content
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Рендерер MessagePack для внутренних клиентов."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
@@ -0,0 +1,144 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+
+from django.utils.functional import cached_property
+
+from api.caches import GenerationSnapshot
+from foodgram.settings import INGREDIENT_FUZZY_THRESHOLD
+from recipes.models import Ingredient
+
+SEPARATOR = '\n'
+WORD_RE = re.compile(r'\w+')
+
+
+def get_trigrams(text):
+    """Триграммы слов строки, дополненных пробелами, как в pg_trgm."""
+    trigrams = set()
+    for word in WORD_RE.findall(text.casefold()):
+        padded = f'  {word} '
+        trigrams.update(
+            padded[start:start + 3] for start in range(len(padded) - 2)
+        )
+    return trigrams
+
+
+class IndexState:
+    """Снимок каталога ингредиентов для одного поколения."""
+
+    def __init__(self, rows):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        self.keys = [row[0] for row in rows]
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        self.starts = []
+        position = 0
+        for key in self.keys:
+            self.starts.append(position)
+            position += len(key) + len(SEPARATOR)
+        self.text = SEPARATOR.join(self.keys)
+
+    @cached_property
+    def trigram_index(self):
+        postings = defaultdict(list)
+        sizes = []
+        for index, key in enumerate(self.keys):
+            trigrams = get_trigrams(key)
+            sizes.append(len(trigrams))
+            for trigram in trigrams:
+                postings[trigram].append(index)
+        return dict(postings), sizes
+
+    @property
+    def postings(self):
+        return self.trigram_index[0]
+
+    @property
+    def sizes(self):
+        return self.trigram_index[1]
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+       Строится лениво при первом поиске и перестраивается, когда
+       меняется поколение `ingredients`. Названия приводятся к casefold
+       и сортируются: совпадения по префиксу ищутся бинарным поиском,
+       по подстроке - `str.find` по склеенным названиям. Совпадения
+       по префиксу идут первыми, внутри групп - по алфавиту.
+       Нечёткий поиск ранжирует названия по сходству триграмм.
+    """
+
+    def __init__(self):
+        self.state = GenerationSnapshot('ingredients', self.build)
+
+    def build(self):
+        return IndexState(Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        ).iterator())
+
+    def get_state(self):
+        return self.state.get()
+
+    def search(self, query, limit=None):
+        """Ингредиенты, название которых начинается с запроса
+           или содержит его, без учёта регистра.
+            Args:
+                query (str): Строка поиска.
+                limit (int): Максимальное число результатов.
+            Returns:
+                list: Словари с полями `id`, `name`, `measurement_unit`.
+        """
+        state = self.get_state()
+        keys, items, text, starts = (
+            state.keys, state.items, state.text, state.starts
+        )
+        query = query.casefold().replace(SEPARATOR, ' ')
+        if not query:
+            return items[:limit]
+        first = bisect_left(keys, query)
+        last = bisect_left(keys, query[:-1] + chr(ord(query[-1]) + 1))
+        results = items[first:last][:limit]
+        if limit is not None and len(results) >= limit:
+            return results
+        position = text.find(query)
+        while position != -1:
+            index = bisect_right(starts, position) - 1
+            if not first <= index < last:
+                results.append(items[index])
+                if limit is not None and len(results) >= limit:
+                    break
+            if index + 1 == len(starts):
+                break
+            position = text.find(query, starts[index + 1])
+        return results
+
+    def fuzzy_search(self, query, limit=None):
+        """Ингредиенты, похожие на запрос с опечатками.
+           Сходство - коэффициент Жаккара множеств триграмм, как
+           `similarity` в pg_trgm. Кандидаты берутся из списков
+           триграмм запроса, поэтому остальной каталог не просматривается.
+            Returns:
+                list: Словари ингредиентов по убыванию сходства.
+        """
+        state = self.get_state()
+        trigrams = get_trigrams(query)
+        if not trigrams:
+            return []
+        shared = Counter()
+        for trigram in trigrams:
+            shared.update(state.postings.get(trigram, ()))
+        scored = []
+        for index, count in shared.items():
+            similarity = count / (len(trigrams) + state.sizes[index] - count)
+            if similarity >= INGREDIENT_FUZZY_THRESHOLD:
+                scored.append((-similarity, index))
+        scored.sort()
+        return [state.items[index] for _, index in scored[:limit]]
+
+
+ingredient_index = IngredientIndex()
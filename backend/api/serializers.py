@@ -1,15 +1,84 @@
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.http import QueryDict
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework.generics import get_object_or_404
+from rest_framework.pagination import _positive_int
 
 from recipes.models import (Cart, Ingredient, IngredientRecipe, Recipe, Tag,
                             TagRecipe, )
+from recipes.shopping_list import get_recipe_amounts
+from recipes.signals import recipe_ingredients_changed
+from api.fields import (CachedTagField, ImageVariantField,
+                        StreamingBase64ImageField, get_image_url, )
+from api.tags import tag_cache
+from api.viewer import get_viewer_context
+from foodgram.settings import SUBSCRIPTION_RECIPES_MAX_LIMIT
 from users.models import CustomUser
 
 
-class CustomUserSerializer(UserSerializer):
+def get_requested_fields(request, available):
+    """Поля ответа с учётом параметров `?fields=` и `?omit=`.
+        Args:
+            request (Request): Текущий запрос.
+            available (tuple): Все поля сериализатора по порядку.
+        Returns:
+            tuple: Запрошенные поля в исходном порядке.
+    """
+    if request is None:
+        return tuple(available)
+    params = request.query_params
+    fields = {name for name in params.get('fields', '').split(',') if name}
+    omit = {name for name in params.get('omit', '').split(',') if name}
+    return tuple(
+        name for name in available
+        if (not fields or name in fields) and name not in omit
+    )
+
+
+def get_recipes_limit(request):
+    """Сколько рецептов автора отдавать в подписках: `?recipes_limit=`,
+       но не больше SUBSCRIPTION_RECIPES_MAX_LIMIT.
+    """
+    if request is None:
+        return SUBSCRIPTION_RECIPES_MAX_LIMIT
+    try:
+        return _positive_int(
+            request.query_params['recipes_limit'],
+            strict=True,
+            cutoff=SUBSCRIPTION_RECIPES_MAX_LIMIT,
+        )
+    except (KeyError, ValueError):
+        return SUBSCRIPTION_RECIPES_MAX_LIMIT
+
+
+class ViewerContextMixin:
+    """ Доступ к снимку связей текущего пользователя """
+
+    @property
+    def viewer(self):
+        return get_viewer_context(self.context.get('request'))
+
+
+class SparseFieldsetMixin:
+    """ Убирает из корневого сериализатора поля вне `?fields=`/`?omit=` """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+        requested = get_requested_fields(request, self.fields)
+        for name in set(self.fields) - set(requested):
+            self.fields.pop(name)
+
+
+class CustomUserSerializer(SparseFieldsetMixin, ViewerContextMixin,
+                           UserSerializer):
     is_subscribed = SerializerMethodField()
 
     class Meta:
@@ -29,10 +98,7 @@ class CustomUserSerializer(UserSerializer):
             :param obj: пользователь, который подписан
             :return: вернет True or False, если подписан
         """
-        request = self.context.get('request')
-        if self.context.get('request').user.is_anonymous:
-            return False
-        return obj.following.filter(user=request.user).exists()
+        return obj.id in self.viewer.following_ids
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -92,7 +158,8 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsetMixin, ViewerContextMixin,
+                           serializers.ModelSerializer):
     """ Сериализатор просмотра рецепта """
     tags = TagSerializer(read_only=False, many=True)
     author = CustomUserSerializer(read_only=True, )
@@ -102,7 +169,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField(max_length=None)
+    image = ImageVariantField()
 
     class Meta:
         model = Recipe
@@ -131,11 +198,9 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                 bool: True - если рецепт в `избранном`
                 у запращивающего пользователя, иначе - False.
         """
-        request = self.context.get('request')
-
-        if not request or request.user.is_anonymous:
-            return False
-        return recipe.favorited.filter(user=request.user).exists()
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
+        return recipe.id in self.viewer.favorite_ids
 
     def get_is_in_shopping_cart(self, recipe):
         """Проверка - находится ли рецепт в списке  покупок.
@@ -145,14 +210,146 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                 bool: True - если рецепт в `списке покупок`
             у запращивающего пользователя, иначе - False.
         """
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        return recipe.carts.filter(user=request.user).exists()
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
+        return recipe.id in self.viewer.cart_ids
+
+
+class RecipeFlatSerializer(ViewerContextMixin):
+    """Быстрый сериализатор списка рецептов только для чтения.
+       Строит тот же JSON, что и RecipeReadSerializer, но из строк
+       `.values()` и двух пакетных запросов за тэгами и ингридиентами,
+       не создавая вложенные сериализаторы на каждый рецепт.
+    """
+    field_columns = {
+        'id': ('id',),
+        'author': (
+            'author_id', 'author__email', 'author__username',
+            'author__first_name', 'author__last_name',
+        ),
+        'is_favorited': ('is_favorited',),
+        'is_in_shopping_cart': ('is_in_shopping_cart',),
+        'name': ('name',),
+        'image': ('image', 'thumbnails_version'),
+        'text': ('text',),
+        'cooking_time': ('cooking_time',),
+    }
+    flag_fields = ('is_favorited', 'is_in_shopping_cart')
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+        self.fields = get_requested_fields(
+            self.context.get('request'), RecipeReadSerializer.Meta.fields
+        )
+
+    @classmethod
+    def get_values_fields(cls, fields, with_flags):
+        """Столбцы `.values()`, нужные для запрошенных полей.
+           `modified` нужен всегда: из него строится ETag страницы.
+        """
+        columns = ['id', 'modified']
+        for name in fields:
+            if name in cls.flag_fields and not with_flags:
+                continue
+            columns.extend(
+                column for column in cls.field_columns.get(name, ())
+                if column not in columns
+            )
+        return columns
+
+    @staticmethod
+    def load_tags(recipe_ids):
+        tag_ids = defaultdict(list)
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'tag_id')
+        for recipe_id, tag_id in rows:
+            tag_ids[recipe_id].append(tag_id)
+        tags = defaultdict(list)
+        for recipe_id, ids in tag_ids.items():
+            tags[recipe_id] = tag_cache.get_sorted(ids)
+        return tags
+
+    @staticmethod
+    def load_ingredients(recipe_ids):
+        ingredients = defaultdict(list)
+        rows = IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list(
+            'recipe_id', 'id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        )
+        for recipe_id, row_id, name, measurement_unit, amount in rows:
+            ingredients[recipe_id].append({
+                'id': row_id,
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            })
+        return ingredients
+
+    def get_id(self, row):
+        return row['id']
+
+    def get_tags(self, row):
+        return self.tags[row['id']]
+
+    def get_author(self, row):
+        if row['author_id'] is None:
+            return None
+        return {
+            'email': row['author__email'],
+            'id': row['author_id'],
+            'username': row['author__username'],
+            'first_name': row['author__first_name'],
+            'last_name': row['author__last_name'],
+            'is_subscribed': row['author_id'] in self.viewer.following_ids,
+        }
+
+    def get_ingredients(self, row):
+        return self.ingredients[row['id']]
+
+    def get_is_favorited(self, row):
+        return bool(row.get('is_favorited', False))
+
+    def get_is_in_shopping_cart(self, row):
+        return bool(row.get('is_in_shopping_cart', False))
+
+    def get_name(self, row):
+        return row['name']
+
+    def get_image(self, row):
+        return get_image_url(
+            row['image'], row['thumbnails_version'], self.context
+        )
+
+    def get_text(self, row):
+        return row['text']
+
+    def get_cooking_time(self, row):
+        return row['cooking_time']
+
+    @property
+    def data(self):
+        rows = list(self.instance) if self.many else [self.instance]
+        recipe_ids = [row['id'] for row in rows]
+        if 'tags' in self.fields:
+            self.tags = self.load_tags(recipe_ids)
+        if 'ingredients' in self.fields:
+            self.ingredients = self.load_ingredients(recipe_ids)
+        getters = [
+            (name, getattr(self, f'get_{name}')) for name in self.fields
+        ]
+        data = [
+            {name: getter(row) for name, getter in getters} for row in rows
+        ]
+        return data if self.many else data[0]
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = CachedTagField(
         many=True,
         queryset=Tag.objects.all()
     )
@@ -160,7 +357,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeSerializer(many=True, )
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
-    image = Base64ImageField(max_length=None)
+    image = StreamingBase64ImageField(max_length=None)
 
     class Meta:
         model = Recipe
@@ -177,11 +374,28 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             'cooking_time',
         )
 
-    def validate_tags(self, tags):
-        for tag in tags:
-            if not Tag.objects.filter(id=tag.id).exists():
-                raise serializers.ValidationError('Выбранный тег отсутствует')
-        return tags
+    def to_internal_value(self, data):
+        """Принимает рецепт как в JSON, так и в multipart/form-data.
+           В форме тэги передаются повторяющимся полем `tags`,
+           ингредиенты - JSON-строкой, изображение - файлом.
+        """
+        if isinstance(data, QueryDict):
+            data = self.parse_form_data(data)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def parse_form_data(data):
+        parsed = data.dict()
+        if 'tags' in data:
+            parsed['tags'] = data.getlist('tags')
+        if isinstance(parsed.get('ingredients'), str):
+            try:
+                parsed['ingredients'] = json.loads(parsed['ingredients'])
+            except ValueError:
+                raise serializers.ValidationError({'ingredients': [
+                    'Ингредиенты передаются списком в формате JSON'
+                ]})
+        return parsed
 
     def validate_cooking_time(self, cooking_time):
         if cooking_time < 1:
@@ -219,6 +433,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
             )
         IngredientRecipe.objects.bulk_create(ingredient_list)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создаёт рецепт.
             Args:
@@ -234,9 +449,13 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
 
         self.create_ingredients(recipe, ingredients)
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe=recipe, old_amounts={}
+        )
 
         return recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         """Обновляет рецепт.
             Args:
@@ -246,10 +465,15 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 Recipe: Обновлённый рецепт.
         """
         recipe.tags.clear()
+        # Старый состав нужен, чтобы изменить списки покупок на разницу.
+        old_amounts = get_recipe_amounts(recipe.id)
         IngredientRecipe.objects.filter(recipe=recipe).delete()
         recipe.tags.set(validated_data.pop('tags'))
         ingredients = validated_data.pop('ingredients')
         self.create_ingredients(recipe, ingredients)
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe=recipe, old_amounts=old_amounts
+        )
         return super().update(recipe, validated_data)
 
     def to_representation(self, instance):
@@ -260,17 +484,40 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """ Сериализатор для избранных рецептов и покупок """
+    image = ImageVariantField(variant='small')
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
+class PantryRecipeSerializer(RecipeShortSerializer):
+    """Рецепт из подбора по продуктам с числом недостающих
+       и совпавших ингредиентов.
+    """
+    missing_count = serializers.IntegerField(read_only=True)
+    matched_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeShortSerializer.Meta):
+        fields = RecipeShortSerializer.Meta.fields + (
+            'missing_count', 'matched_count'
+        )
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по продуктам пользователя."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
 class SubscribeSerializer(CustomUserSerializer):
     """
         Сериализатор вывода авторов на которых подписан текущий пользователь.
     """
-    recipes = RecipeShortSerializer(many=True, read_only=True)
+    recipes = SerializerMethodField()
     recipes_count = SerializerMethodField()
 
     class Meta:
@@ -287,17 +534,32 @@ class SubscribeSerializer(CustomUserSerializer):
         )
         read_only_fields = ('email', 'username', 'first_name', 'last_name')
 
+    def get_recipes(self, obj):
+        """ Последние рецепты автора, не больше `?recipes_limit=`.
+        Если рецепты подгружены заранее, срез берётся из них.
+        """
+        recipes = obj.recipes.all()[
+            :get_recipes_limit(self.context.get('request'))
+        ]
+        return RecipeShortSerializer(
+            recipes, many=True, context=self.context
+        ).data
+
     def get_recipes_count(self, obj):
         """ Показывает общее количество рецептов у каждого автора.
+        Берётся из аннотации `recipes_count`, если она есть.
         Args:
             obj (User): Запрошенный пользователь.
         Returns:
             int: Количество рецептов созданных запрошенным пользователем.
         """
-        return obj.recipes.count()
+        count = getattr(obj, 'recipes_count', None)
+        if count is None:
+            return obj.recipes.count()
+        return count
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(ViewerContextMixin, serializers.ModelSerializer):
     """Сериализатор для списка покупок """
 
     class Meta:
@@ -306,7 +568,11 @@ class CartSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         user = data['user']
-        if user.carts.filter(recipe=data['recipe']).exists():
+        if user == self.viewer.user:
+            in_cart = data['recipe'].id in self.viewer.cart_ids
+        else:
+            in_cart = user.carts.filter(recipe=data['recipe']).exists()
+        if in_cart:
             raise serializers.ValidationError(
                 'Рецепт уже добавлен в корзину'
             )
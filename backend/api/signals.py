@@ -0,0 +1,81 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.caches import bump_generation_on_commit
+from api.pantry import pantry_index
+from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, Tag, TagRecipe, )
+from recipes.signals import recipe_ingredients_changed
+from recipes.thumbnails import thumbnails_ready
+from users.models import CustomUser
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=TagRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(thumbnails_ready)
+def invalidate_recipes(**kwargs):
+    bump_generation_on_commit('recipes')
+
+
+def invalidate_carts_with(carts):
+    """Сдвигает поколения корзин, чей список покупок изменился
+       вместе с составом рецептов.
+    """
+    user_ids = carts.values_list('user_id', flat=True).distinct()
+    scopes = [f'carts:{user_id}' for user_id in user_ids]
+    if scopes:
+        bump_generation_on_commit(*scopes)
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    pantry_index.record_change(instance.recipe_id)
+    invalidate_carts_with(Cart.objects.filter(recipe_id=instance.recipe_id))
+
+
+@receiver(recipe_ingredients_changed)
+def invalidate_recipe_composition(recipe, **kwargs):
+    # Ингредиенты рецепта создаются через bulk_create без сигналов.
+    pantry_index.record_change(recipe.id)
+    invalidate_carts_with(Cart.objects.filter(recipe=recipe))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_generation_on_commit('tags', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_ingredients(**kwargs):
+    bump_generation_on_commit('ingredients', 'recipes')
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_carts(instance, created, **kwargs):
+    # Название и единица измерения попадают в списки покупок.
+    if not created:
+        invalidate_carts_with(
+            Cart.objects.filter(recipe__ingredients=instance)
+        )
+
+
+@receiver((post_save, post_delete), sender=CustomUser)
+def invalidate_users(update_fields=None, **kwargs):
+    # Вход в систему обновляет только last_login, который не попадает
+    # в ответы API.
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_generation_on_commit('users')
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def invalidate_favorites(instance, **kwargs):
+    bump_generation_on_commit(f'favorites:{instance.user_id}')
+
+
+@receiver((post_save, post_delete), sender=Cart)
+def invalidate_carts(instance, **kwargs):
+    bump_generation_on_commit(f'carts:{instance.user_id}')
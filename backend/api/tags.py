@@ -0,0 +1,80 @@
+from api.caches import GenerationSnapshot
+from foodgram.settings import GENERATION_SNAPSHOT_MIN_AGE
+from recipes.models import Tag
+
+
+class TagState:
+    """Снимок всех тэгов в порядке сортировки модели."""
+
+    def __init__(self, rows):
+        self.items = [dict(row) for row in rows]
+        self.by_id = {item['id']: item for item in self.items}
+        self.by_slug = {item['slug']: item for item in self.items}
+        self.positions = {
+            item['id']: position for position, item in enumerate(self.items)
+        }
+
+
+class TagCache:
+    """Каталог тэгов в памяти процесса.
+       Тэги меняются редко, поэтому загружаются одним запросом и
+       перечитываются только при смене поколения `tags`. Снимок
+       не изменяется после построения, а его замена защищена
+       блокировкой, поэтому кэш безопасно делят потоки воркера.
+       Словари тэгов общие для всех запросов и не должны изменяться.
+       Тэги, созданные без сигналов (bulk_create в load_tags) или
+       прочитанные до фиксации транзакции, в снимке отсутствуют:
+       встретив неизвестный id, кэш пересобирает снимок.
+    """
+
+    def __init__(self):
+        self.state = GenerationSnapshot('tags', self.build)
+
+    def build(self):
+        return TagState(Tag.objects.values('id', 'name', 'color', 'slug'))
+
+    def all(self):
+        return self.state.get().items
+
+    def get_state(self, tag_ids, min_age=0):
+        """Снимок, пересобранный, если в нём нет каких-то из `tag_ids`."""
+        state = self.state.get()
+        if not state.by_id.keys() >= set(tag_ids):
+            state = self.state.refresh(state, min_age)
+        return state
+
+    def get(self, pk):
+        # id приходит от пользователя: неизвестные id не должны
+        # пересобирать снимок на каждом запросе.
+        return self.get_state(
+            (pk,), GENERATION_SNAPSHOT_MIN_AGE
+        ).by_id.get(pk)
+
+    def get_slug_choices(self):
+        return [(slug, slug) for slug in self.state.get().by_slug]
+
+    def get_ids(self, slugs):
+        by_slug = self.state.get().by_slug
+        return [by_slug[slug]['id'] for slug in slugs if slug in by_slug]
+
+    def get_sorted(self, tag_ids):
+        """Тэги по их id в порядке сортировки модели.
+           id прочитаны из базы, поэтому снимок без них устарел;
+           тэги, удалённые после чтения id, пропускаются.
+        """
+        state = self.get_state(tag_ids)
+        return [
+            state.by_id[pk]
+            for pk in sorted(
+                (pk for pk in tag_ids if pk in state.positions),
+                key=state.positions.__getitem__,
+            )
+        ]
+
+
+tag_cache = TagCache()
+
+
+def get_tag_slug_choices():
+    # Функция, а не метод: FilterSet копирует фильтры через deepcopy.
+    return tag_cache.get_slug_choices()
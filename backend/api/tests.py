@@ -0,0 +1,369 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+
+from api.caches import get_generation
+from api.renderers import ORJSONRenderer
+from api.tags import tag_cache
+from api.views import RecipeViewSet
+from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
+                            Recipe, ShoppingListItem, Tag, )
+from recipes.shopping_list import find_inconsistent_users
+from recipes.signals import recipe_ingredients_changed
+from users.models import CustomUser, Follow
+
+MEDIA_ROOT = tempfile.mkdtemp()
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+        'TIMEOUT': None,
+    }
+}
+RECIPES_COUNT = 12
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, CACHES=TEST_CACHES)
+class RecipeDataTestCase(APITestCase):
+    """Общие данные: авторы, тэги, ингредиенты и рецепты,
+       а также пользователь со своим избранным, корзиной и подписками.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            CustomUser.objects.create_user(
+                email=f'author{index}@foodgram.ru',
+                username=f'author{index}',
+                first_name='Автор',
+                last_name=f'Фамилия{index}',
+                password='password-123',
+            )
+            for index in range(3)
+        ]
+        cls.viewer = CustomUser.objects.create_user(
+            email='viewer@foodgram.ru',
+            username='viewer',
+            first_name='Читатель',
+            last_name='Читатель',
+            password='password-123',
+        )
+        cls.tags = [
+            Tag.objects.create(name=name, color=color, slug=slug)
+            for name, color, slug in (
+                ('Завтрак', '#E26C2D', 'breakfast'),
+                ('Обед', '#49B64E', 'dinner'),
+                ('Ужин', '#8775D2', 'supper'),
+            )
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('курица', 'яйца', 'орехи', 'соль', 'мука')
+        ]
+        cls.recipes = []
+        for index in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=cls.authors[index % 3],
+                name=f'Рецепт {index}',
+                text=f'Описание рецепта {index}',
+                cooking_time=10 + index,
+                image='recipes/image/test.png',
+            )
+            recipe.tags.set((
+                cls.tags[index % 3], cls.tags[(index + 1) % 3]
+            ))
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=10 + index
+                )
+                for ingredient in (
+                    cls.ingredients[index % 5],
+                    cls.ingredients[(index + 2) % 5],
+                )
+            )
+            recipe_ingredients_changed.send(sender=Recipe, recipe=recipe)
+            cls.recipes.append(recipe)
+        for recipe in cls.recipes[:4]:
+            Favorite.objects.create(user=cls.viewer, recipe=recipe)
+        for recipe in cls.recipes[2:6]:
+            Cart.objects.create(user=cls.viewer, recipe=recipe)
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.viewer, author=author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # Кэш тэгов в памяти процесса прогревается заранее:
+        # бюджет считается для работающего процесса.
+        tag_cache.all()
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.force_authenticate(self.viewer)
+
+
+class RecipeQueryBudgetTest(RecipeDataTestCase):
+    """Число запросов к базе для чтения рецептов не зависит
+       от размера страницы и не превышает бюджет.
+       Каждый запрос выполняется с пустым кэшем ответов.
+    """
+    list_budgets = (
+        ('', 4, 5),
+        ('?count=false', 3, 4),
+        ('?cursor=', 3, 4),
+        ('?tags=breakfast&tags=dinner', 4, 5),
+        ('?author={author}', 5, 6),
+        ('?search=рецепт', 4, 5),
+        ('?ingredients={ingredient}', 5, 6),
+        ('?exclude_ingredients={ingredient}', 5, 6),
+        ('?fields=id,name', 2, 2),
+    )
+    authenticated_list_budgets = (
+        ('?is_favorited=1', 5),
+        ('?is_in_shopping_cart=1', 5),
+    )
+
+    def format_query(self, query):
+        return query.format(
+            author=self.authors[0].id, ingredient=self.ingredients[0].id
+        )
+
+    def assert_list_budget(self, client, query, budget):
+        for limit in (3, RECIPES_COUNT):
+            cache.clear()
+            tag_cache.all()
+            url = f'/api/recipes/{self.format_query(query)}'
+            url += ('&' if '?' in url else '?') + f'limit={limit}'
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_anonymous_list(self):
+        for query, budget, _ in self.list_budgets:
+            self.assert_list_budget(self.anonymous, query, budget)
+
+    def test_authenticated_list(self):
+        for query, _, budget in self.list_budgets:
+            self.assert_list_budget(self.authenticated, query, budget)
+        for query, budget in self.authenticated_list_budgets:
+            self.assert_list_budget(self.authenticated, query, budget)
+
+    def test_detail(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        for client, budget in ((self.anonymous, 4), (self.authenticated, 5)):
+            cache.clear()
+            tag_cache.all()
+            with self.subTest(budget=budget), self.assertNumQueries(budget):
+                self.assertEqual(client.get(url).status_code, 200)
+
+    def test_shared_count(self):
+        # Без фильтров по избранному и корзине количество общее
+        # для всех пользователей: COUNT не повторяется.
+        self.anonymous.get('/api/recipes/')
+        with self.assertNumQueries(4):
+            response = self.authenticated.get('/api/recipes/')
+        self.assertEqual(response.data['count'], RECIPES_COUNT)
+
+    def test_cached_anonymous_list(self):
+        url = '/api/recipes/'
+        self.anonymous.get(url)
+        with self.assertNumQueries(0):
+            response = self.anonymous.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+
+class RecipeFlatSerializerParityTest(RecipeDataTestCase):
+    """Быстрый список рецептов побайтно совпадает с ответом,
+       построенным через RecipeReadSerializer на тех же данных.
+    """
+    queries = (
+        '?limit=12',
+        '?limit=5&page=2',
+        '?tags=breakfast',
+        '?fields=id,name,tags',
+        '?omit=author,ingredients',
+        '?fields=id,is_favorited',
+    )
+    authenticated_queries = ('?is_favorited=1', '?is_in_shopping_cart=1')
+
+    def get_content(self, client, url):
+        cache.clear()
+        tag_cache.all()
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def assert_parity(self, client, query):
+        url = f'/api/recipes/{query}'
+        with self.subTest(url=url):
+            flat = self.get_content(client, url)
+            with mock.patch.object(
+                RecipeViewSet, 'flat_serializer_class', None
+            ):
+                full = self.get_content(client, url)
+            self.assertEqual(flat, full)
+
+    def test_anonymous_list(self):
+        for query in self.queries:
+            self.assert_parity(self.anonymous, query)
+
+    def test_authenticated_list(self):
+        for query in self.queries + self.authenticated_queries:
+            self.assert_parity(self.authenticated, query)
+
+
+class TagCacheTest(RecipeDataTestCase):
+    """Тэги, созданные без сигналов, не ломают список рецептов."""
+
+    def test_tag_created_without_signals(self):
+        # Как в команде load_tags: bulk_create не отправляет сигналы,
+        # и снимок тэгов в памяти процесса остаётся прежним.
+        tag, = Tag.objects.bulk_create(
+            [Tag(name='Десерт', color='#F0A0C0', slug='dessert')]
+        )
+        if tag.pk is None:
+            tag = Tag.objects.get(slug='dessert')
+        Recipe.tags.through.objects.bulk_create(
+            [Recipe.tags.through(tag=tag, recipe=self.recipes[-1])]
+        )
+        response = self.anonymous.get('/api/recipes/?limit=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'dessert',
+            [item['slug'] for item in response.json()['results'][0]['tags']],
+        )
+        self.assertEqual(tag_cache.get(tag.id)['slug'], 'dessert')
+
+
+class GenerationOnCommitTest(RecipeDataTestCase):
+    """Поколения сдвигаются только после фиксации транзакции."""
+
+    def test_bump_after_commit(self):
+        recipes = get_generation('recipes')
+        cart = get_generation(f'carts:{self.viewer.id}')
+        with self.captureOnCommitCallbacks(execute=True):
+            Cart.objects.create(user=self.viewer, recipe=self.recipes[-1])
+            self.recipes[-1].save()
+            self.assertEqual(get_generation('recipes'), recipes)
+            self.assertEqual(get_generation(f'carts:{self.viewer.id}'), cart)
+        self.assertNotEqual(get_generation('recipes'), recipes)
+        self.assertNotEqual(get_generation(f'carts:{self.viewer.id}'), cart)
+
+    def test_recipe_change_bumps_carts(self):
+        author = APIClient()
+        author.force_authenticate(self.authors[0])
+        scope = f'carts:{self.viewer.id}'
+        # Рецепт 0 не в корзине, рецепт 3 - в корзине читателя.
+        for recipe, changed in ((self.recipes[0], False),
+                                (self.recipes[3], True)):
+            generation = get_generation(scope)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = author.patch(
+                    f'/api/recipes/{recipe.id}/',
+                    {
+                        'tags': [self.tags[0].id],
+                        'ingredients': [
+                            {'id': self.ingredients[1].id, 'amount': 3}
+                        ],
+                    },
+                    format='json',
+                )
+            self.assertEqual(response.status_code, 200)
+            with self.subTest(recipe=recipe.id):
+                self.assertEqual(
+                    get_generation(scope) != generation, changed
+                )
+
+
+class ShoppingListItemTest(RecipeDataTestCase):
+    """Список покупок совпадает с корзиной после каждого изменения."""
+
+    def setUp(self):
+        super().setUp()
+        self.author = APIClient()
+        self.author.force_authenticate(self.authors[0])
+        self.recipe = self.recipes[3]
+
+    def assert_consistent(self):
+        self.assertEqual(find_inconsistent_users(), [])
+
+    def cart_url(self, recipe):
+        return f'/api/recipes/{recipe.id}/shopping_cart/'
+
+    def test_add_and_remove(self):
+        self.assert_consistent()
+        recipe = self.recipes[-1]
+        response = self.authenticated.post(self.cart_url(recipe))
+        self.assertEqual(response.status_code, 201)
+        self.assert_consistent()
+        response = self.authenticated.delete(self.cart_url(recipe))
+        self.assertEqual(response.status_code, 204)
+        self.assert_consistent()
+
+    def test_edit_recipe(self):
+        for ingredients in (
+            # Одно количество меняется, один ингредиент добавляется.
+            [(self.ingredients[3], 5), (self.ingredients[0], 40),
+             (self.ingredients[2], 7)],
+            # Ингредиенты убираются целиком.
+            [(self.ingredients[4], 1)],
+        ):
+            response = self.author.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {
+                    'tags': [self.tags[0].id],
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': amount}
+                        for ingredient, amount in ingredients
+                    ],
+                },
+                format='json',
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assert_consistent()
+
+    def test_delete_recipe(self):
+        response = self.author.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_consistent()
+
+    def test_amount_below_cart(self):
+        # Суммы разошлись с корзиной в обход сигналов.
+        ShoppingListItem.objects.filter(user=self.viewer).update(amount=1)
+        response = self.authenticated.delete(self.cart_url(self.recipes[2]))
+        self.assertEqual(response.status_code, 204)
+        response = self.author.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(
+            ShoppingListItem.objects.filter(amount__lt=0).exists()
+        )
+
+
+class ORJSONRendererTest(SimpleTestCase):
+    """Рендерер на orjson совпадает со стандартным рендерером DRF."""
+
+    def test_same_output(self):
+        data = {
+            'name': 'Строка\u2028с разделителями\u2029строк',
+            'values': [1, 2.5, None, True, 'текст'],
+            'nested': {'id': 1, 'items': [{'amount': 10}]},
+        }
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_non_finite_float(self):
+        for value in (float('nan'), float('inf'), [{'x': -float('inf')}]):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render({'value': value})
+                with self.assertRaises(ValueError):
+                    ORJSONRenderer().render({'value': value})
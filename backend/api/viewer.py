@@ -0,0 +1,64 @@
+from django.utils.functional import cached_property
+
+from recipes.models import Cart, Favorite
+from users.models import Follow
+
+
+class ViewerContext:
+    """Снимок связей текущего пользователя на время одного запроса.
+       Избранное, список покупок и подписки загружаются лениво,
+       каждое одним запросом, и дальше проверяются по множествам в памяти.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def is_anonymous(self):
+        return self.user is None or self.user.is_anonymous
+
+    def _load_ids(self, model, field):
+        if self.is_anonymous:
+            return frozenset()
+        return frozenset(
+            model.objects.filter(user=self.user).values_list(field, flat=True)
+        )
+
+    @cached_property
+    def favorite_ids(self):
+        return self._load_ids(Favorite, 'recipe_id')
+
+    @cached_property
+    def cart_ids(self):
+        return self._load_ids(Cart, 'recipe_id')
+
+    @cached_property
+    def following_ids(self):
+        return self._load_ids(Follow, 'author_id')
+
+    def get_version(self, *relations):
+        """Состояние связей пользователя для валидаторов HTTP-кэша.
+            Args:
+                relations (str): Имена множеств, например `cart_ids`.
+        """
+        if self.is_anonymous:
+            return None
+        return (self.user.id,) + tuple(
+            sorted(getattr(self, relation)) for relation in relations
+        )
+
+    def reset(self):
+        """Сбрасывает загруженные множества после изменения связей."""
+        for name in ('favorite_ids', 'cart_ids', 'following_ids'):
+            self.__dict__.pop(name, None)
+
+
+def get_viewer_context(request):
+    """Возвращает снимок связей пользователя, общий для всего запроса."""
+    if request is None:
+        return ViewerContext(None)
+    viewer = getattr(request, '_viewer_context', None)
+    if viewer is None or viewer.user != request.user:
+        viewer = ViewerContext(request.user)
+        request._viewer_context = viewer
+    return viewer
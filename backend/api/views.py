@@ -1,5 +1,8 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Subquery,
+                              prefetch_related_objects, )
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import Coalesce, RowNumber
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -10,21 +13,34 @@ from rest_framework.permissions import (IsAuthenticated,
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from api.caches import get_generation, make_cache_key
+from api.catalogue import catalogue_response
+from api.exporters import (ExportContentNegotiation, get_export_renderers,
+                           get_exporter, )
 from api.filters import IngredientFilter, RecipeFilter
-from api.mixins import SubscribeStatusViewSetMixin
+from api.mixins import (AnonymousResponseCacheMixin,
+                        ConditionalGetViewSetMixin,
+                        KeysetPaginationViewSetMixin,
+                        SubscribeStatusViewSetMixin, )
 from api.pagination import CustomPagination
+from api.pantry import pantry_index
 from api.permissions import (IsAdminOrReadOnly,
                              IsAuthorOrAdminOrReadOnly, )
 from api.serializers import (CartSerializer, IngredientSerializer,
-                             RecipeReadSerializer, RecipeShortSerializer,
+                             PantryQuerySerializer, PantryRecipeSerializer,
+                             RecipeFlatSerializer, RecipeReadSerializer,
+                             RecipeShortSerializer,
                              RecipeWriteSerializer, SubscribeSerializer,
-                             TagSerializer, CustomUserSerializer, )
+                             TagSerializer, CustomUserSerializer,
+                             get_recipes_limit, get_requested_fields, )
+from api.tags import tag_cache
+from api.viewer import get_viewer_context
 from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
-                            Recipe, Tag, )
+                            Recipe, ShoppingListItem, Tag, )
 from users.models import CustomUser, Follow
 
 
-class TagViewSet(ModelViewSet):
+class TagViewSet(AnonymousResponseCacheMixin, ModelViewSet):
     """Работает с тэгами.
        Изменение и создание тэгов разрешено только админам,
        остальным только разрешен просмотр
@@ -32,9 +48,16 @@ class TagViewSet(ModelViewSet):
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
     queryset = Tag.objects.all()
+    response_cache_scopes = ('tags',)
 
+    def get_queryset(self):
+        """Список тэгов берётся из кэша тэгов, а не из базы."""
+        if self.action == 'list':
+            return tag_cache.all()
+        return super().get_queryset()
 
-class IngredientViewSet(ModelViewSet):
+
+class IngredientViewSet(AnonymousResponseCacheMixin, ModelViewSet):
     """
         Вывод ингридиентов.
     """
@@ -43,47 +66,234 @@ class IngredientViewSet(ModelViewSet):
     queryset = Ingredient.objects.all()
     filter_backends = (IngredientFilter,)
     search_fields = ('^name',)
+    response_cache_scopes = ('ingredients',)
+
+    def list(self, request, *args, **kwargs):
+        """Весь каталог в JSON отдаётся готовыми сжатыми байтами."""
+        if not request.query_params and (
+                request.accepted_renderer.format == 'json'
+        ):
+            return catalogue_response(request)
+        return super().list(request, *args, **kwargs)
 
 
-class RecipeViewSet(ModelViewSet, SubscribeStatusViewSetMixin):
+class RecipeViewSet(AnonymousResponseCacheMixin, ConditionalGetViewSetMixin,
+                    KeysetPaginationViewSetMixin, ModelViewSet,
+                    SubscribeStatusViewSetMixin):
     """
         Вьюсет для работы с рецептами.
     """
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     pagination_class = CustomPagination
+    keyset_ordering = ('-id',)
+    response_cache_scopes = ('recipes', 'users')
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    read_actions = ('list', 'retrieve')
+    flat_serializer_class = RecipeFlatSerializer
+    select_related = {'author': 'author'}
+    prefetch_related = {
+        'tags': 'tags',
+        'ingredients': Prefetch(
+            'ingredienttorecipe',
+            queryset=IngredientRecipe.objects.select_related('ingredient'),
+        ),
+    }
+    deferrable_fields = ('name', 'image', 'text', 'cooking_time')
+    image_variants = {'list': 'medium'}
+
+    def get_queryset(self):
+        """Аннотирует рецепты флагами избранного и списка покупок.
+           Флаги считаются подзапросами для всей страницы сразу,
+           для анонимного пользователя аннотации не добавляются.
+           Для чтения связанные объекты подгружаются заранее, чтобы
+           число запросов не зависело от размера страницы, а для
+           быстрого списка выбираются только нужные столбцы.
+           Поля, исключённые через `?fields=`/`?omit=`, не загружаются.
+        """
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        flags = self.get_flag_annotations(fields)
+        if flags:
+            queryset = queryset.annotate(**flags)
+        if self.uses_flat_serializer():
+            return queryset.values(
+                *self.flat_serializer_class.get_values_fields(
+                    fields, with_flags=bool(flags)
+                )
+            )
+        if self.action not in self.read_actions:
+            return queryset
+        select_related = [
+            lookup for name, lookup in self.select_related.items()
+            if name in fields
+        ]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        return queryset.prefetch_related(*(
+            lookup for name, lookup in self.prefetch_related.items()
+            if name in fields
+        )).defer(*(
+            name for name in self.deferrable_fields if name not in fields
+        ))
+
+    def get_serializer_context(self):
+        """Добавляет размер изображения по умолчанию для действия."""
+        context = super().get_serializer_context()
+        context['image_variant'] = self.image_variants.get(self.action)
+        return context
+
+    def get_requested_fields(self):
+        if self.action not in self.read_actions:
+            return RecipeReadSerializer.Meta.fields
+        return get_requested_fields(
+            self.request, RecipeReadSerializer.Meta.fields
+        )
+
+    def get_flag_annotations(self, fields):
+        user = self.request.user
+        if user.is_anonymous:
+            return {}
+        flags = {
+            'is_favorited': Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            'is_in_shopping_cart': Exists(
+                Cart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        }
+        return {name: flag for name, flag in flags.items() if name in fields}
+
+    def uses_flat_serializer(self):
+        return self.action == 'list' and self.flat_serializer_class
+
+    def get_count_cache_key(self):
+        """Ключ кэша количества рецептов для текущих фильтров.
+           Включает поколения рецептов, а для фильтров по избранному
+           и списку покупок - пользователя и поколения его связей.
+           Без этих фильтров количество одно для всех пользователей.
+        """
+        params = RecipeFilter.get_cache_params(self.request.query_params)
+        generations = [get_generation('recipes')]
+        user_id = None
+        if params['is_favorited'] or params['is_in_shopping_cart']:
+            user_id = self.request.user.id
+        if params['is_favorited']:
+            generations.append(get_generation(f'favorites:{user_id}'))
+        if params['is_in_shopping_cart']:
+            generations.append(get_generation(f'carts:{user_id}'))
+        return make_cache_key('recipes-count', generations, user_id, params)
+
+    def get_list_validators(self, page):
+        """Валидаторы страницы списка: версии рецептов страницы
+           с флагами пользователя, нормализованные параметры запроса,
+           количество и ссылки пагинатора, подписки пользователя.
+           Все данные уже загружены для ответа, запросов к базе нет.
+           Last-Modified для списка не отдаём: удаление рецепта
+           не увеличивает максимальное время изменения.
+        """
+        fields = self.get_requested_fields()
+        flags = [
+            name for name in RecipeFlatSerializer.flag_fields
+            if name in fields
+        ]
+        rows = [
+            row if isinstance(row, dict) else vars(row) for row in page
+        ]
+        versions = [
+            (row['id'], row['modified'], *(row.get(flag) for flag in flags))
+            for row in rows
+        ]
+        query = sorted(
+            (name, sorted(values))
+            for name, values in self.request.query_params.lists()
+        )
+        viewer = get_viewer_context(self.request)
+        version = viewer.get_version(
+            *(['following_ids'] if 'author' in fields else [])
+        )
+        return (versions, query, self.get_page_state(), version), None
+
+    def get_object_validators(self):
+        """Валидаторы рецепта: его версия и флаги пользователя."""
+        user = self.request.user
+        fields = self.get_requested_fields()
+        flags = self.get_flag_annotations(fields)
+        try:
+            recipe = self.get_queryset().select_related(
+                None
+            ).prefetch_related(None).filter(
+                pk=self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+            ).values('id', 'modified', 'author_id', *flags).first()
+        except (TypeError, ValueError):
+            return None
+        if recipe is None:
+            return None
+        if user.is_anonymous:
+            return (recipe,), recipe['modified']
+        viewer = get_viewer_context(self.request)
+        subscribed = (
+            'author' in fields
+            and recipe['author_id'] in viewer.following_ids
+        )
+        return (recipe, user.id, subscribed), None
 
     def get_serializer_class(self):
+        if self.uses_flat_serializer():
+            return self.flat_serializer_class
         if self.request.method == 'GET':
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
-    def send_message(self, ingredients):
-        shopping_list = 'Купить в магазине:'
-        for ingredient in ingredients:
-            shopping_list += (
-                f"\n{ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__measurement_unit']}) - "
-                f"{ingredient['amount']}")
-        file = 'shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename="{file}.txt"'
-        return response
-
     @action(
         detail=False,
         methods=('GET',),
         permission_classes=(IsAuthenticated,),
+        renderer_classes=get_export_renderers(),
+        content_negotiation_class=ExportContentNegotiation,
     )
     def download_shopping_cart(self, request):
-        ingredients = IngredientRecipe.objects.filter(
-            recipe__carts__user=request.user
+        """Выгружает список покупок в формате из `?format=txt|csv|pdf`."""
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        return self.send_message(ingredients)
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+        exporter = get_exporter(request.accepted_renderer.format)
+        return exporter.export(ingredients, request.user)
+
+    @action(detail=False, methods=('GET',))
+    def pantry(self, request):
+        """Подбирает рецепты по продуктам пользователя.
+           `?ingredients=` - id имеющихся ингредиентов, `?max_missing=` -
+           сколько ингредиентов может не хватать. Рецепты ищутся
+           по индексу в памяти, из базы читается только страница.
+        """
+        query = PantryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        matches = pantry_index.match(
+            query.validated_data['ingredients'],
+            query.validated_data.get('max_missing'),
+        )
+        # Обычная пагинация без кэша количества: оно считается по индексу.
+        paginator = CustomPagination()
+        rows = paginator.paginate_queryset(matches, request)
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'thumbnails_version', 'cooking_time'
+        ).in_bulk([row['id'] for row in rows])
+        results = []
+        for row in rows:
+            recipe = recipes.get(row['id'])
+            if recipe is None:
+                continue
+            recipe.missing_count = row['missing']
+            recipe.matched_count = row['matched']
+            results.append(recipe)
+        serializer = PantryRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
 
     @action(
         detail=True,
@@ -99,7 +309,8 @@ class RecipeViewSet(ModelViewSet, SubscribeStatusViewSetMixin):
         }
         serializer = CartSerializer(data=data, context=context)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @shopping_cart.mapping.delete
@@ -126,7 +337,8 @@ class RecipeViewSet(ModelViewSet, SubscribeStatusViewSetMixin):
         )
 
 
-class CustomUserViewSet(UserViewSet, SubscribeStatusViewSetMixin):
+class CustomUserViewSet(KeysetPaginationViewSetMixin, UserViewSet,
+                        SubscribeStatusViewSetMixin):
     """Работает с пользователями.
        ViewSet для работы с пользователми - вывод таковых,
        регистрация.
@@ -136,6 +348,20 @@ class CustomUserViewSet(UserViewSet, SubscribeStatusViewSetMixin):
     serializer_class = CustomUserSerializer
     queryset = CustomUser.objects.all()
     pagination_class = CustomPagination
+    keyset_ordering = ('last_name', 'id')
+    deferrable_fields = ('email', 'username', 'first_name', 'last_name')
+
+    def get_queryset(self):
+        """Не загружает столбцы, исключённые через `?fields=`/`?omit=`."""
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        fields = get_requested_fields(
+            self.request, CustomUserSerializer.Meta.fields
+        )
+        return queryset.defer(*(
+            name for name in self.deferrable_fields if name not in fields
+        ))
 
     @action(
         detail=True,
@@ -150,6 +376,29 @@ class CustomUserViewSet(UserViewSet, SubscribeStatusViewSetMixin):
             SubscribeSerializer
         )
 
+    @staticmethod
+    def get_latest_recipes(author_ids, limit):
+        """Не больше `limit` последних рецептов каждого автора
+           одним запросом. Номер рецепта у автора считает оконная
+           функция ROW_NUMBER; Django 3.2 не фильтрует по окну,
+           поэтому запрос с ней оборачивается в подзапрос.
+        """
+        ranked = Recipe.objects.filter(author_id__in=author_ids).annotate(
+            author_position=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('id').desc(),
+            )
+        ).order_by().values('id', 'author_position')
+        sql, params = ranked.query.sql_with_params()
+        return Recipe.objects.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE author_position <= %s',
+            (*params, limit),
+        )).only(
+            'id', 'author_id', 'name', 'image', 'thumbnails_version',
+            'cooking_time',
+        )
+
     @action(
         detail=False,
         permission_classes=(IsAuthenticated,)
@@ -157,7 +406,25 @@ class CustomUserViewSet(UserViewSet, SubscribeStatusViewSetMixin):
     def subscriptions(self, request):
         user = request.user
         queryset = CustomUser.objects.filter(following__user=user)
+        fields = get_requested_fields(request, SubscribeSerializer.Meta.fields)
+        if 'recipes_count' in fields:
+            # Подзапрос, а не Count: без GROUP BY сохраняется сортировка
+            # модели, и число считается только для авторов страницы.
+            queryset = queryset.annotate(recipes_count=Coalesce(Subquery(
+                Recipe.objects.filter(author=OuterRef('pk')).order_by(
+                ).values('author').annotate(total=Count('id')).values('total')
+            ), 0))
+        queryset = queryset.defer(*(
+            name for name in self.deferrable_fields if name not in fields
+        ))
         pages = self.paginate_queryset(queryset)
+        if 'recipes' in fields:
+            prefetch_related_objects(pages, Prefetch(
+                'recipes',
+                queryset=self.get_latest_recipes(
+                    [author.id for author in pages], get_recipes_limit(request)
+                ),
+            ))
         serializer = SubscribeSerializer(pages, many=True,
                                          context={'request': request})
         return self.get_paginated_response(serializer.data)
@@ -0,0 +1,11 @@
+"""Воспроизводимые замеры производительности API.
+Запуск из каталога backend:
+
+    python -m benchmarks <замер> [параметры]
+
+Параметры замера выводит `python -m benchmarks <замер> --help`.
+Данные создаются в отдельной тестовой базе, как у `manage.py test`,
+и удаляются после замера; кэш - в памяти процесса, файлы - во временном
+каталоге. Время и память зависят от машины: сравнивать имеет смысл
+прогоны на одной машине.
+"""
@@ -0,0 +1,59 @@
+import argparse
+import importlib
+import os
+import shutil
+import tempfile
+
+import django
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment, )
+
+BENCHMARKS = (
+    'renderer',
+    'image_memory',
+    'uploads',
+    'shopping_list',
+    'ingredient_search',
+    'ingredient_filters',
+    'pantry',
+)
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmarks',
+        'TIMEOUT': None,
+    }
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Замеры производительности API',
+    )
+    parser.add_argument('benchmark', choices=BENCHMARKS)
+    parser.add_argument(
+        'args', nargs=argparse.REMAINDER, help='Параметры замера'
+    )
+    options = parser.parse_args()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    django.setup()
+    # Модули замеров импортируют приложения, поэтому после setup().
+    benchmark = importlib.import_module(f'benchmarks.{options.benchmark}')
+    media_root = tempfile.mkdtemp()
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with override_settings(
+            CACHES=BENCHMARK_CACHES, MEDIA_ROOT=media_root
+        ):
+            benchmark.run(options.args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Память и время пересохранения загруженных изображений.
+   process_image вызывается в `--workers` потоках одновременно, как
+   в пуле image_executor; печатается прирост пиковой памяти процесса.
+   Пиковая память процесса не уменьшается, поэтому каждое сочетание
+   параметров измеряется отдельным запуском.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from api.fields import Base64ImageField, process_image
+from benchmarks.utils import create_jpeg_in_subprocess, get_max_rss, measure
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks image_memory'
+    )
+    parser.add_argument('--width', type=int, default=4096)
+    parser.add_argument('--height', type=int, default=3072)
+    parser.add_argument('--quality', type=int, default=92)
+    parser.add_argument(
+        '--orientation', type=int, default=1,
+        help='Поворот из EXIF, 6 - на 90 градусов',
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='Сколько изображений обрабатывается одновременно',
+    )
+    options = parser.parse_args(argv)
+    content = create_jpeg_in_subprocess(
+        options.width, options.height, options.quality, options.orientation
+    )
+
+    def process(_):
+        output, _ = process_image(
+            BytesIO(content), Base64ImageField.ALLOWED_TYPES
+        )
+        output.seek(0, 2)
+        return output.tell()
+
+    # Кодеки Pillow загружаются до замера.
+    process_image(BytesIO(create_jpeg_in_subprocess(16, 16)), ('jpeg',))
+    max_rss = get_max_rss()
+    with ThreadPoolExecutor(max_workers=options.workers) as executor:
+        elapsed, sizes = measure(
+            lambda: list(executor.map(process, range(options.workers)))
+        )
+    print(
+        f'{options.width}x{options.height}, поворот {options.orientation}, '
+        f'потоков {options.workers}: {elapsed / 1000:.2f} с, '
+        f'пиковая память +{get_max_rss() - max_rss:.0f} МБ, '
+        f'исходный файл {len(content) // 1024} КБ, '
+        f'результат {sizes[0] // 1024} КБ'
+    )
@@ -0,0 +1,74 @@
+"""Фильтры рецептов по включённым и исключённым ингредиентам.
+   Количество рецептов с двумя ингредиентами и без двух других
+   считается запросом RecipeFilter (полусоединения и NOT EXISTS)
+   и, для сравнения, коррелированными EXISTS и соединениями
+   с DISTINCT. Печатается также время страницы API с этими фильтрами.
+"""
+import argparse
+
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from benchmarks.utils import (create_ingredients, create_recipes,
+                              create_user, get_client, measure, )
+from recipes.models import IngredientRecipe, Recipe
+
+
+def contains(ingredient_id):
+    return Exists(IngredientRecipe.objects.filter(
+        recipe=OuterRef('pk'), ingredient=ingredient_id
+    ))
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks ingredient_filters'
+    )
+    parser.add_argument('--recipes', type=int, default=20000)
+    parser.add_argument('--ingredients', type=int, default=200)
+    parser.add_argument('--per-recipe', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    options = parser.parse_args(argv)
+    user = create_user()
+    ingredient_ids = create_ingredients(options.ingredients)
+    create_recipes(
+        user, options.recipes, ingredient_ids, options.per_recipe
+    )
+    # Статистика для планировщика, как после автоматического ANALYZE.
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    included, excluded = ingredient_ids[:2], ingredient_ids[2:4]
+    params = QueryDict(mutable=True)
+    params.setlist('ingredients', included)
+    params.setlist('exclude_ingredients', excluded)
+    print(
+        f'Рецептов: {options.recipes}, строк ингредиентов: '
+        f'{options.recipes * options.per_recipe}, фильтр: {params.urlencode()}'
+    )
+    querysets = (
+        ('RecipeFilter', lambda: RecipeFilter(
+            params, queryset=Recipe.objects.all()
+        ).qs),
+        ('коррелированные EXISTS', lambda: Recipe.objects.filter(
+            *(contains(pk) for pk in included)
+        ).exclude(Exists(IngredientRecipe.objects.filter(
+            recipe=OuterRef('pk'), ingredient__in=excluded
+        )))),
+        ('соединения и DISTINCT', lambda: Recipe.objects.filter(
+            ingredients=included[0]
+        ).filter(ingredients=included[1]).exclude(
+            ingredients__in=excluded
+        ).distinct()),
+    )
+    for name, get_queryset in querysets:
+        elapsed, count = measure(
+            lambda: get_queryset().count(), options.repeat
+        )
+        print(f'{name}: {count} рецептов, {elapsed:.2f} мс')
+    client = get_client(user)
+    url = f'/api/recipes/?count=false&{params.urlencode()}'
+    client.get(url)
+    elapsed, response = measure(lambda: client.get(url), options.repeat)
+    print(f'API: ответ {response.status_code}, {elapsed:.2f} мс')
@@ -0,0 +1,56 @@
+"""Поиск ингредиентов по названию: индекс в памяти против SQL.
+   Ингредиенты загружаются из data/ingredients.json, как командой
+   load_data. Для каждого запроса печатается время поиска по индексу,
+   запросов istartswith и icontains и ответа API. API запрашивается
+   от имени пользователя: анонимные ответы берутся из кэша.
+"""
+import argparse
+import json
+import os
+
+from api.search import ingredient_index
+from benchmarks.utils import create_user, get_client, measure
+from foodgram.settings import BASE_DIR
+from recipes.models import Ingredient
+
+QUERIES = ('мо', 'кур', 'соль', 'томатная паста', 'а')
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks ingredient_search'
+    )
+    parser.add_argument('queries', nargs='*', default=QUERIES)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=1000)
+    options = parser.parse_args(argv)
+    with open(
+        os.path.join(BASE_DIR, 'data', 'ingredients.json'), encoding='utf-8'
+    ) as data:
+        Ingredient.objects.bulk_create(
+            Ingredient(**ingredient) for ingredient in json.load(data)
+        )
+    # Индекс строится до замера, как в работающем процессе.
+    ingredient_index.search('')
+    print(f'Ингредиентов: {Ingredient.objects.count()}')
+    client = get_client(create_user())
+    client.get('/api/ingredients/', {'name': options.queries[0]})
+    limit, repeat = options.limit, options.repeat
+    for query in options.queries:
+        index, results = measure(
+            lambda: ingredient_index.search(query, limit), repeat
+        )
+        prefix, _ = measure(lambda: list(Ingredient.objects.filter(
+            name__istartswith=query
+        )[:limit]), repeat)
+        substring, _ = measure(lambda: list(Ingredient.objects.filter(
+            name__icontains=query
+        )[:limit]), repeat)
+        api, _ = measure(lambda: client.get(
+            '/api/ingredients/', {'name': query, 'limit': limit}
+        ), repeat // 10 or 1)
+        print(
+            f'{query!r}: найдено {len(results)}, индекс {index:.3f} мс, '
+            f'istartswith {prefix:.3f} мс, icontains {substring:.3f} мс, '
+            f'API {api:.3f} мс'
+        )
@@ -0,0 +1,88 @@
+"""Индекс «что приготовить из продуктов».
+   Массивы индекса строятся из синтетических пар (рецепт, ингредиент)
+   без базы: печатается время сборки, применения изменённых рецептов,
+   подбора по индексу с наложенными изменениями и без них и слияния
+   изменений в массивы. С `--db-recipes` дополнительно измеряется
+   сборка индекса из базы.
+"""
+import argparse
+
+import numpy as np
+
+from api.caches import get_generation
+from api.pantry import PANTRY_SCOPE, PantryIndex, PantryState
+from benchmarks.utils import (create_ingredients, create_recipes,
+                              create_user, measure, )
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks pantry')
+    parser.add_argument('--recipes', type=int, default=1000000)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--per-recipe', type=int, default=8)
+    parser.add_argument(
+        '--changes', type=int, default=1000,
+        help='Сколько изменённых рецептов наложить на индекс',
+    )
+    parser.add_argument(
+        '--pantry', type=int, default=8, help='Продуктов у пользователя'
+    )
+    parser.add_argument(
+        '--db-recipes', type=int, default=0,
+        help='Рецептов в базе для замера сборки из базы',
+    )
+    options = parser.parse_args(argv)
+    random = np.random.default_rng(0)
+    recipe_ids = np.repeat(
+        np.arange(1, options.recipes + 1), options.per_recipe
+    )
+    ingredient_ids = random.integers(
+        1, options.ingredients, size=len(recipe_ids)
+    )
+    pairs = np.unique(
+        np.stack((recipe_ids, ingredient_ids), axis=1), axis=0
+    ).reshape(-1)
+    generation = get_generation(PANTRY_SCOPE)
+    elapsed, state = measure(lambda: PantryState(pairs, generation))
+    print(f'Рецептов: {options.recipes}, сборка массивов: {elapsed:.0f} мс')
+    elapsed, _ = measure(
+        lambda: state.apply({5: frozenset((1, 2, 3))}, generation)
+    )
+    print(f'применение одного рецепта: {elapsed:.2f} мс')
+    changes = {
+        int(recipe_id): frozenset(
+            random.integers(1, options.ingredients, 6).tolist()
+        )
+        for recipe_id in random.integers(
+            1, options.recipes, options.changes
+        )
+    }
+    elapsed, changed = measure(lambda: state.apply(changes, generation))
+    print(f'применение {len(changes)} рецептов: {elapsed:.2f} мс')
+    index = PantryIndex()
+    pantry = list(range(1, options.pantry + 1))
+    for name, index_state in (('без изменений', state),
+                              ('с изменениями', changed)):
+        # Поколение состояния совпадает с текущим, поэтому индекс
+        # не пересобирается и подбор идёт по этим массивам.
+        index.state = index_state
+        index.match(pantry)
+        elapsed, matches = measure(lambda: index.match(pantry), 20)
+        print(
+            f'подбор {name}: {elapsed:.1f} мс, '
+            f'найдено {len(matches.recipe_ids)}'
+        )
+    elapsed, _ = measure(
+        lambda: PantryState(changed.get_pairs(), generation)
+    )
+    print(f'слияние изменений: {elapsed:.0f} мс')
+    if options.db_recipes:
+        create_recipes(
+            create_user(), options.db_recipes,
+            create_ingredients(options.ingredients), options.per_recipe,
+        )
+        elapsed, _ = measure(index.build)
+        print(
+            f'сборка из базы, рецептов {options.db_recipes}: '
+            f'{elapsed:.0f} мс'
+        )
@@ -0,0 +1,47 @@
+"""Рендеринг ответов: JSONRenderer DRF против ORJSONRenderer.
+   Страница списка и один рецепт получаются обычными запросами к API,
+   затем рендерятся повторно обоими рендерерами.
+"""
+import argparse
+
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer, has_non_finite
+from benchmarks.utils import (create_ingredients, create_recipes,
+                              create_tags, create_user, get_client,
+                              measure, )
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks renderer')
+    parser.add_argument(
+        '--recipes', type=int, default=100, help='Рецептов на странице'
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=300, help='Число повторов'
+    )
+    options = parser.parse_args(argv)
+    recipe_ids = create_recipes(
+        create_user(), options.recipes, create_ingredients(50), 8,
+        tags=create_tags(),
+    )
+    client = get_client()
+    payloads = (
+        ('список', client.get(f'/api/recipes/?limit={options.recipes}').data),
+        ('рецепт', client.get(f'/api/recipes/{recipe_ids[0]}/').data),
+    )
+    for name, data in payloads:
+        outputs = []
+        for renderer in (JSONRenderer(), ORJSONRenderer()):
+            renderer.render(data)
+            elapsed, output = measure(
+                lambda: renderer.render(data), options.repeat
+            )
+            outputs.append(output)
+            print(
+                f'{name}, {type(renderer).__name__}: {elapsed:.3f} мс, '
+                f'{len(output)} байт'
+            )
+        elapsed, _ = measure(lambda: has_non_finite(data), options.repeat)
+        print(f'{name}, проверка NaN: {elapsed:.3f} мс')
+        print(f'{name}, ответы совпадают: {outputs[0] == outputs[1]}')
@@ -0,0 +1,114 @@
+"""Выгрузка списка покупок для большой корзины.
+   Для каждого формата печатаются время ответа, время до первой части
+   потока и пик памяти Python (tracemalloc). Для сравнения измеряется
+   исходная выгрузка: агрегация по корзине при запросе и склейка
+   строки. PDF измеряется дважды: построение и готовый файл.
+"""
+import argparse
+import shutil
+import tempfile
+import time
+import tracemalloc
+from unittest import mock
+
+from django.db.models import Sum
+
+from benchmarks.utils import (create_ingredients, create_recipes,
+                              create_user, get_client, )
+from recipes import shopping_list
+from recipes.models import Cart, IngredientRecipe
+
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/?format={}'
+
+
+def download_old(user):
+    """Выгрузка до ShoppingListItem и потоковой отдачи."""
+    ingredients = IngredientRecipe.objects.filter(
+        recipe__carts__user=user
+    ).order_by('ingredient__name').values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(amount=Sum('amount'))
+    content = 'Купить в магазине:'
+    for ingredient in ingredients:
+        content += (
+            f"\n{ingredient['ingredient__name']} "
+            f"({ingredient['ingredient__measurement_unit']}) - "
+            f"{ingredient['amount']}"
+        )
+    return content.encode()
+
+
+def download(client, export_format):
+    response = client.get(DOWNLOAD_URL.format(export_format))
+    if not response.streaming:
+        return response.content, None
+    chunks = iter(response.streaming_content)
+    first = next(chunks, b'')
+    first_chunk = time.perf_counter()
+    return first + b''.join(chunks), first_chunk
+
+
+def measure_download(name, func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    content, first_chunk = func()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    first_chunk = (
+        f', первая часть {(first_chunk - started) * 1000:.1f} мс'
+        if first_chunk else ''
+    )
+    print(
+        f'{name}: {elapsed * 1000:.1f} мс{first_chunk}, '
+        f'пик памяти {peak // 1024} КБ, размер {len(content) // 1024} КБ'
+    )
+    return content
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks shopping_list'
+    )
+    parser.add_argument(
+        '--recipes', type=int, default=1000, help='Рецептов в корзине'
+    )
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--per-recipe', type=int, default=10)
+    options = parser.parse_args(argv)
+    user = create_user()
+    recipe_ids = create_recipes(
+        user, options.recipes, create_ingredients(options.ingredients),
+        options.per_recipe,
+    )
+    Cart.objects.bulk_create(
+        (Cart(user=user, recipe_id=recipe_id) for recipe_id in recipe_ids),
+        batch_size=5000,
+    )
+    shopping_list.rebuild([user.id])
+    print(
+        f'Рецептов в корзине: {options.recipes}, '
+        f'строк ингредиентов: {len(recipe_ids) * options.per_recipe}, '
+        f'строк списка: {user.shopping_list.count()}'
+    )
+    client = get_client(user)
+    download(client, 'txt')
+    old = measure_download('исходная выгрузка', lambda: (
+        download_old(user), None
+    ))
+    new = measure_download('txt', lambda: download(client, 'txt'))
+    print(f'txt совпадает с исходной выгрузкой: {old == new}')
+    measure_download('csv', lambda: download(client, 'csv'))
+    cache_dir = tempfile.mkdtemp()
+    try:
+        with mock.patch(
+            'api.exporters.SHOPPING_LIST_PDF_CACHE_DIR', cache_dir
+        ):
+            measure_download('pdf, построение', lambda: download(
+                client, 'pdf'
+            ))
+            measure_download('pdf, готовый файл', lambda: download(
+                client, 'pdf'
+            ))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
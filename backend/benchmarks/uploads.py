@@ -0,0 +1,86 @@
+"""Загрузка рецепта с изображением: base64 в JSON против multipart.
+   Печатает размер тела, время запроса POST /api/recipes/ и прирост
+   пиковой памяти процесса. Уменьшенные копии не создаются: их
+   обработчик отключается на время замера. С `--parse-only`
+   изображение не проверяется и не пересохраняется Pillow, и замер
+   показывает только разбор тела запроса.
+   Пиковая память процесса не уменьшается, поэтому каждый формат
+   измеряется отдельным запуском.
+"""
+import argparse
+import base64
+import json
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.signals import post_save
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from benchmarks.utils import (create_ingredients, create_jpeg_in_subprocess,
+                              create_tags, create_user, get_client,
+                              get_max_rss, measure, )
+from recipes.models import Recipe
+from recipes.signals import make_recipe_thumbnails
+
+
+def pass_through(upload, allowed_types):
+    upload.seek(0)
+    return upload, 'jpeg'
+
+
+def get_request(image_format, fields, content):
+    """Тело и тип содержимого запроса в выбранном формате."""
+    if image_format == 'base64':
+        encoded = base64.b64encode(content).decode()
+        body = json.dumps({
+            **fields, 'image': f'data:image/jpeg;base64,{encoded}'
+        })
+        return body.encode(), 'application/json'
+    body = encode_multipart(BOUNDARY, {
+        **fields,
+        'ingredients': json.dumps(fields['ingredients']),
+        'image': SimpleUploadedFile('image.jpg', content, 'image/jpeg'),
+    })
+    return body, MULTIPART_CONTENT
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks uploads')
+    parser.add_argument('format', choices=('base64', 'multipart'))
+    parser.add_argument('--width', type=int, default=4096)
+    parser.add_argument('--height', type=int, default=3072)
+    parser.add_argument(
+        '--parse-only', action='store_true',
+        help='Не проверять и не пересохранять изображение',
+    )
+    options = parser.parse_args(argv)
+    content = create_jpeg_in_subprocess(options.width, options.height)
+    client = get_client(create_user())
+    fields = {
+        'name': 'Рецепт с большим изображением',
+        'text': 'Описание',
+        'cooking_time': 5,
+        'tags': [create_tags()[0].id],
+        'ingredients': [{'id': create_ingredients(1)[0], 'amount': 3}],
+    }
+    body, content_type = get_request(options.format, fields, content)
+    del content
+    with ExitStack() as stack:
+        post_save.disconnect(make_recipe_thumbnails, sender=Recipe)
+        stack.callback(
+            post_save.connect, make_recipe_thumbnails, sender=Recipe
+        )
+        if options.parse_only:
+            stack.enter_context(
+                mock.patch('api.fields.process_image', pass_through)
+            )
+        max_rss = get_max_rss()
+        elapsed, response = measure(lambda: client.generic(
+            'POST', '/api/recipes/', body, content_type
+        ))
+    print(
+        f'{options.format}, тело {len(body) // 1024} КБ: '
+        f'ответ {response.status_code}, {elapsed / 1000:.2f} с, '
+        f'пиковая память +{get_max_rss() - max_rss:.0f} МБ'
+    )
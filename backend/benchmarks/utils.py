@@ -0,0 +1,147 @@
+"""Общие части замеров: время, память и тестовые данные."""
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+from random import Random
+
+import django
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.fields import EXIF_ORIENTATION
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from users.models import CustomUser
+
+
+def measure(func, repeat=1):
+    """Вызывает `func` `repeat` раз.
+        Returns:
+            tuple: Среднее время вызова в миллисекундах
+            и результат последнего вызова.
+    """
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def get_max_rss():
+    """Пиковый размер резидентной памяти процесса в мегабайтах."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def create_jpeg(width, height, quality=92, orientation=1):
+    """JPEG из шума и градиента: сжимается примерно как фотография.
+        Returns:
+            bytes: Содержимое файла.
+    """
+    noise = Image.effect_noise((width, height), 48)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    image = Image.merge('RGB', (noise, gradient, noise))
+    exif = Image.Exif()
+    if orientation != 1:
+        exif[EXIF_ORIENTATION] = orientation
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=quality, exif=exif)
+    return output.getvalue()
+
+
+def create_jpeg_in_subprocess(*args, **kwargs):
+    """create_jpeg в отдельном процессе: распакованное изображение
+       не попадает в пиковую память замера.
+    """
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=get_context('spawn'),
+        initializer=django.setup,
+    ) as executor:
+        return executor.submit(create_jpeg, *args, **kwargs).result()
+
+
+def create_user(username='benchmark'):
+    return CustomUser.objects.create_user(
+        email=f'{username}@foodgram.ru',
+        username=username,
+        first_name='Замер',
+        last_name='Замеров',
+        password='password-123',
+    )
+
+
+def get_client(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+def create_tags():
+    return [
+        Tag.objects.create(name=name, color=color, slug=slug)
+        for name, color, slug in (
+            ('Завтрак', '#E26C2D', 'breakfast'),
+            ('Обед', '#49B64E', 'dinner'),
+            ('Ужин', '#8775D2', 'supper'),
+        )
+    ]
+
+
+def create_ingredients(count):
+    """Создаёт `count` ингредиентов, возвращает их id."""
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'ингредиент {index:05d}', measurement_unit='г')
+        for index in range(count)
+    )
+    return list(Ingredient.objects.values_list('id', flat=True))
+
+
+def create_recipes(author, count, ingredient_ids, per_recipe,
+                   tags=(), seed=0):
+    """Создаёт рецепты через bulk_create со случайными ингредиентами.
+       Сигналы не отправляются: поисковый индекс и списки покупок
+       при необходимости пересобираются замером.
+        Returns:
+            list: id созданных рецептов.
+    """
+    random = Random(seed)
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author=author,
+                name=f'Рецепт {index}',
+                text=f'Описание рецепта {index}',
+                cooking_time=5 + index % 60,
+                image='recipes/image/benchmark.jpg',
+            )
+            for index in range(count)
+        ),
+        batch_size=1000,
+    )
+    recipe_ids = list(
+        Recipe.objects.filter(author=author).values_list('id', flat=True)
+    )
+    IngredientRecipe.objects.bulk_create(
+        (
+            IngredientRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in random.sample(ingredient_ids, per_recipe)
+        ),
+        batch_size=5000,
+    )
+    if tags:
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+                for recipe_id in recipe_ids
+                for tag in random.sample(list(tags), 2)
+            ),
+            batch_size=5000,
+        )
+    return recipe_ids
@@ -99,6 +99,33 @@ else:
         }
     }
 
+# Кэш общий для всех процессов: в нём поколения данных, закэшированные
+# ответы и счётчики попаданий, которые видят все воркеры gunicorn
+# и management-команды. Для разработки - файлы, в бою - memcached.
+if DEBUG:
+    DEFAULT_CACHE_BACKEND = (
+        'django.core.cache.backends.filebased.FileBasedCache'
+    )
+    DEFAULT_CACHE_LOCATION = os.path.join(BASE_DIR, 'cache', 'django')
+else:
+    DEFAULT_CACHE_BACKEND = (
+        'django.core.cache.backends.memcached.PyMemcacheCache'
+    )
+    DEFAULT_CACHE_LOCATION = 'memcached:11211'
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default=DEFAULT_CACHE_BACKEND),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', default=DEFAULT_CACHE_LOCATION
+        ),
+        # Временные ключи задают срок явно; поколения и счётчики
+        # не должны истекать, в том числе после incr, который
+        # в файловом кэше перезаписывает ключ со сроком по умолчанию.
+        'TIMEOUT': None,
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 AUTH_USER_MODEL = 'users.CustomUser'
@@ -135,6 +162,11 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# Файлы из multipart-форм сразу пишутся на диск, а не в память
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -149,6 +181,17 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'api.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SIMPLE_JWT = {
@@ -204,3 +247,54 @@ MAX_LEN_CODE_COLOR = 7
 EMPTY_MSG = '-пусто-'
 # выдаем ошибку при авторизации.
 ERR_MSG = 'Не удается войти в систему с учетными данными.'
+# Время жизни закэшированного количества объектов в пагинации (секунды)
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+# Сколько последних рецептов автора отдавать в подписках,
+# если `recipes_limit` не задан или больше
+SUBSCRIPTION_RECIPES_MAX_LIMIT = 100
+# Время жизни закэшированных ответов для анонимных пользователей (секунды)
+RESPONSE_CACHE_TIMEOUT = 300
+# Максимальный размер загружаемого изображения рецепта (байты)
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+# Максимальная сторона загружаемого изображения рецепта (пиксели)
+MAX_IMAGE_SIDE = 4096
+# Число потоков для проверки и пересохранения изображений
+IMAGE_PROCESSING_WORKERS = 2
+# Варианты уменьшенных копий изображений рецептов: имя - (ширина, высота)
+THUMBNAIL_VARIANTS = {
+    'small': (160, 160),
+    'medium': (480, 480),
+}
+# Форматы уменьшенных копий, первый отдаётся по умолчанию
+THUMBNAIL_FORMATS = ('JPEG', 'WEBP')
+THUMBNAIL_QUALITY = 80
+# Число процессов для создания копий, 0 - создавать в процессе запроса
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', default=2))
+# Сколько строк списка покупок читать и отдавать клиенту за раз
+SHOPPING_LIST_CHUNK_SIZE = 500
+# Шрифт с кириллицей для выгрузки списка покупок в PDF
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'PDF_FONT_PATH',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+# Каталог готовых PDF списков покупок и число потоков для их построения
+SHOPPING_LIST_PDF_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'shopping_lists')
+SHOPPING_LIST_PDF_WORKERS = 2
+# Минимальное сходство триграмм для нечёткого поиска ингредиентов
+INGREDIENT_FUZZY_THRESHOLD = 0.3
+# Максимальный возраст данных в памяти процесса (каталоги, индексы), секунды
+GENERATION_SNAPSHOT_MAX_AGE = 600
+# Через сколько секунд снимок можно пересобрать вне очереди, если
+# в нём не нашлось запрошенного пользователем объекта
+GENERATION_SNAPSHOT_MIN_AGE = 1
+# Сколько секунд клиенты могут не перепроверять каталог ингредиентов
+INGREDIENT_CATALOGUE_MAX_AGE = 300
+# Конфигурация полнотекстового поиска рецептов PostgreSQL
+RECIPE_SEARCH_CONFIG = 'russian'
+# Сколько строк состава рецептов читать за раз при сборке индекса продуктов
+PANTRY_INDEX_CHUNK_SIZE = 10000
+# Сколько изменённых рецептов держать поверх индекса продуктов,
+# прежде чем слить их в основные массивы
+PANTRY_INDEX_MAX_CHANGES = 1000
+# Сколько секунд хранить в кэше журнал изменённых рецептов
+PANTRY_CHANGES_TIMEOUT = 2 * GENERATION_SNAPSHOT_MAX_AGE
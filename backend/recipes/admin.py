@@ -4,6 +4,8 @@ from django.utils.html import format_html
 from foodgram.settings import EMPTY_MSG
 from recipes.models import (Cart, Favorite, Ingredient, IngredientRecipe,
                             Recipe, Tag, )
+from recipes import shopping_list
+from recipes.signals import recipe_ingredients_changed
 
 site.site_header = 'Администрирование сайта Foodgram'
 
@@ -48,6 +50,16 @@ class RecipeAdmin(ModelAdmin):
     inlines = (IngredientInline,)
     empty_value_display = EMPTY_MSG
 
+    def save_related(self, request, form, formsets, change):
+        old_amounts = (
+            shopping_list.get_recipe_amounts(form.instance.id)
+            if change else {}
+        )
+        super().save_related(request, form, formsets, change)
+        recipe_ingredients_changed.send(
+            sender=Recipe, recipe=form.instance, old_amounts=old_amounts
+        )
+
     def get_favorites(self, obj):
         return obj.favorited.count()
 
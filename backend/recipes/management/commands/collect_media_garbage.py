@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+from recipes.thumbnails import (THUMBNAIL_DIR, get_storage,
+                                get_thumbnail_names, thumbnail_storage, )
+
+
+def walk(storage, directory):
+    """Перебирает имена всех файлов каталога хранилища рекурсивно."""
+    try:
+        directories, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in directories:
+        yield from walk(storage, f'{directory}/{name}')
+
+
+class Command(BaseCommand):
+    help = 'Удалить изображения и копии, на которые не ссылаются рецепты'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=60,
+            help='Не трогать файлы моложе стольких минут',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        referenced = set(
+            Recipe.objects.exclude(image='').values_list(
+                'image', flat=True
+            ).iterator()
+        )
+        # Копии прежних размеров и качества тоже удаляются.
+        thumbnails = {
+            thumbnail for name in referenced
+            for thumbnail in get_thumbnail_names(name)
+        }
+        self.cutoff = timezone.now() - timedelta(minutes=options['grace'])
+        self.dry_run = options['dry_run']
+        upload_to = Recipe._meta.get_field('image').upload_to.rstrip('/')
+        removed = self.collect(
+            get_storage(), upload_to, lambda name: name in referenced
+        )
+        removed += self.collect(
+            thumbnail_storage,
+            THUMBNAIL_DIR,
+            lambda name: name in thumbnails,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Удалено файлов: {removed}'))
+
+    def collect(self, storage, directory, is_used):
+        removed = 0
+        for name in walk(storage, directory):
+            if is_used(name) or storage.get_modified_time(name) > self.cutoff:
+                continue
+            self.stdout.write(name)
+            if not self.dry_run:
+                storage.delete(name)
+            removed += 1
+        return removed
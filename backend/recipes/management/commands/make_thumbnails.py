@@ -0,0 +1,38 @@
+from concurrent.futures import as_completed
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.thumbnails import submit_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создать уменьшенные копии изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать уже существующие копии',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        names = Recipe.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        futures = {
+            submit_thumbnails(name, options['force']): name
+            for name in names.iterator()
+        }
+        created = failed = 0
+        for future in as_completed(futures):
+            try:
+                created += future.result()
+            except Exception as error:
+                # Одно битое изображение не прерывает обработку остальных.
+                failed += 1
+                self.stderr.write(f'{futures[future]}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано копий: {created}, ошибок: {failed}'
+        ))
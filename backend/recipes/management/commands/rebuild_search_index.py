@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать полнотекстовый индекс рецептов'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        backend = get_backend()
+        with transaction.atomic():
+            backend.drop()
+            backend.create()
+            backend.update()
+        self.stdout.write(self.style.SUCCESS('Индекс пересобран'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from recipes.shopping_list import find_inconsistent_users, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Проверить списки покупок на соответствие корзинам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересобрать расходящиеся списки',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Вместе с --rebuild пересобрать списки всех пользователей',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING('Старт команды'))
+        if options['rebuild'] and options['all']:
+            rebuild()
+            self.stdout.write(self.style.SUCCESS('Все списки пересобраны'))
+            return
+        user_ids = find_inconsistent_users()
+        if not user_ids:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+            return
+        self.stdout.write(
+            f'Расходятся списки пользователей: {", ".join(map(str, user_ids))}'
+        )
+        if options['rebuild']:
+            rebuild(user_ids)
+            self.stdout.write(self.style.SUCCESS('Списки пересобраны'))
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.16 on 2026-10-17 04:01
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientrecipe',
+            name='amount',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MinValueValidator(1, 'Добавьте ингриденты.'), django.core.validators.MaxValueValidator(5000, 'Очень много ингридиентов!')], verbose_name='Количество'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.16 on 2026-10-17 04:09
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_modified'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentHashStorage(), upload_to='recipes/image/', verbose_name='Изображение'),
+        ),
+    ]
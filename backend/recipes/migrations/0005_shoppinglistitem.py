@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-17 04:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    Cart = apps.get_model('recipes', 'Cart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    totals = Cart.objects.values(
+        'user_id',
+        ingredient_id=models.F('recipe__ingredienttorecipe__ingredient'),
+    ).filter(ingredient_id__isnull=False).annotate(
+        amount=models.Sum('recipe__ingredienttorecipe__amount')
+    ).order_by()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(**row) for row in totals.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0004_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке покупок',
+                'verbose_name_plural': 'Список покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='recipes_shoppinglistitem_unique'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
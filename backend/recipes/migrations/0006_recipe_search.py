@@ -0,0 +1,58 @@
+from django.db import migrations
+
+# SQL зафиксирован в миграции: recipes.search может меняться вместе
+# с моделями, а миграция должна выполняться одинаково всегда.
+CREATE_SEARCH_INDEX = {
+    'postgresql': (
+        'CREATE TABLE IF NOT EXISTS recipes_recipe_search ('
+        'recipe_id bigint PRIMARY KEY REFERENCES recipes_recipe (id) '
+        'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+        'document tsvector NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_document '
+        'ON recipes_recipe_search USING gin (document)',
+        'INSERT INTO recipes_recipe_search (recipe_id, document) '
+        "SELECT d.id, setweight(to_tsvector('russian', d.name), 'A') || "
+        "setweight(to_tsvector('russian', d.ingredients), 'B') || "
+        "setweight(to_tsvector('russian', d.text), 'C') "
+        'FROM (SELECT r.id, r.name, r.text, COALESCE(('
+        "SELECT string_agg(i.name, ' ') FROM recipes_ingredientrecipe ir "
+        'JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+        "WHERE ir.recipe_id = r.id), '') AS ingredients "
+        'FROM recipes_recipe r) d '
+        'ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document',
+    ),
+    'sqlite': (
+        'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_search '
+        'USING fts5(name, text, ingredients, '
+        "tokenize='unicode61 remove_diacritics 2')",
+        'DELETE FROM recipes_recipe_search',
+        'INSERT INTO recipes_recipe_search (rowid, name, text, ingredients) '
+        'SELECT r.id, r.name, r.text, COALESCE(('
+        "SELECT group_concat(i.name, ' ') FROM recipes_ingredientrecipe ir "
+        'JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+        "WHERE ir.recipe_id = r.id), '') FROM recipes_recipe r",
+    ),
+}
+DROP_SEARCH_INDEX = 'DROP TABLE IF EXISTS recipes_recipe_search'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for statement in CREATE_SEARCH_INDEX.get(vendor, ()):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SEARCH_INDEX:
+        schema_editor.execute(DROP_SEARCH_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
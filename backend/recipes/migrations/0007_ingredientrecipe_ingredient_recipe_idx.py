@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-17 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredientrecipe',
+            index=models.Index(fields=['ingredient', 'recipe'], name='ingredient_recipe_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.16 on 2026-10-17 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_ingredientrecipe_ingredient_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='thumbnails_version',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32, verbose_name='Версия уменьшенных копий'),
+        ),
+    ]
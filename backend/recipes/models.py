@@ -11,6 +11,8 @@ Models:
     AmountIngredient:
         Модель для связи Ingredient и Recipe.
         Также указывает количество ингридиента.
+    ShoppingListItem:
+        Итоговое количество ингредиента в списке покупок пользователя.
 """
 from django.contrib.auth import get_user_model
 from django.core.validators import (MaxValueValidator, MinValueValidator,
@@ -29,6 +31,7 @@ from foodgram.settings import (
     MIN_AMOUNT_INGREDIENTS,
     MIN_COOKING_TIME,
 )
+from recipes.storage import recipe_image_storage
 
 User = get_user_model()
 
@@ -129,11 +132,18 @@ class Recipe(models.Model):
             Создаётся при добавлении пользователем рецепта в `покупки`.
         image(str):
             Изображение рецепта. Указывает путь к изображению.
+            Файлы называются по хэшу содержимого и не дублируются.
         text(str):
             Описание рецепта. Установлены ограничения по длине.
         cooking_time(int):
             Время приготовления рецепта.
             Установлены ограничения по максимальным и минимальным значениям.
+        modified(datetime):
+            Время последнего изменения рецепта, его ингридиентов или тэгов.
+            Используется как версия рецепта для условных запросов.
+        thumbnails_version(str):
+            Версия готовых уменьшенных копий изображения. Совпадает
+            с `get_thumbnails_version(image)`, когда все копии созданы.
     """
     tags = models.ManyToManyField(
         verbose_name='Тэг',
@@ -160,6 +170,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Изображение',
         upload_to='recipes/image/',
+        storage=recipe_image_storage,
     )
     text = models.TextField(
         verbose_name='Описание',
@@ -179,6 +190,17 @@ class Recipe(models.Model):
             ),
         ),
     )
+    modified = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
+    thumbnails_version = models.CharField(
+        verbose_name='Версия уменьшенных копий',
+        max_length=32,
+        blank=True,
+        default='',
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-id',)
@@ -236,6 +258,11 @@ class IngredientRecipe(models.Model):
             models.UniqueConstraint(
                 fields=['recipe', 'ingredient'],
                 name='unique ingredient')]
+        # Поиск рецептов по ингредиенту читает только индекс.
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='ingredient_recipe_idx')]
 
     def __str__(self) -> str:
         return f'{self.amount} {self.ingredients}'
@@ -346,3 +373,48 @@ class Cart(models.Model):
 
     def __str__(self) -> str:
         return f'{self.user} -> {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя.
+    Денормализованная сумма IngredientRecipe по рецептам корзины.
+    Поддерживается модулем `recipes.shopping_list` при изменении
+    корзины и ингредиентов рецептов, проверяется и пересобирается
+    командой `shopping_lists`.
+    Attributes:
+        user(int):
+            Владелец списка покупок. Связь через ForeignKey.
+        ingredient(int):
+            Ингредиент. Связь через ForeignKey.
+        amount(int):
+            Суммарное количество ингредиента во всех рецептах корзины.
+    """
+    user = models.ForeignKey(
+        verbose_name='Пользователь',
+        related_name='shopping_list',
+        to=User,
+        on_delete=CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        verbose_name='Ингредиент',
+        related_name='+',
+        to=Ingredient,
+        on_delete=CASCADE,
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='%(app_label)s_%(class)s_unique'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} -> {self.ingredient}: {self.amount}'
@@ -0,0 +1,221 @@
+"""Полнотекстовый индекс рецептов по названию, описанию и ингредиентам.
+В PostgreSQL это таблица tsvector с GIN-индексом, в SQLite - виртуальная
+таблица FTS5. Документ рецепта пересобирается одним запросом по его id,
+поэтому индекс обновляется при каждом сохранении рецепта, а поиск
+читает только списки совпавших слов и не зависит от числа рецептов.
+"""
+import re
+
+from django.db import connection as default_connection
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+
+from foodgram.settings import RECIPE_SEARCH_CONFIG
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+
+WORD_RE = re.compile(r'\w+')
+INDEX_TABLE = 'recipes_recipe_search'
+
+
+def get_words(query):
+    return WORD_RE.findall(query.casefold())
+
+
+def get_document_sql():
+    """Подзапрос с полями документа: id, название, описание
+       и названия ингредиентов через пробел.
+    """
+    return (
+        f'SELECT r.id, r.name, r.text, COALESCE(('
+        f'SELECT {{aggregate}} FROM {IngredientRecipe._meta.db_table} ir '
+        f'JOIN {Ingredient._meta.db_table} i ON i.id = ir.ingredient_id '
+        f'WHERE ir.recipe_id = r.id), \'\') AS ingredients '
+        f'FROM {Recipe._meta.db_table} r'
+    )
+
+
+class SearchRank(Func):
+    """Релевантность рецепта по запросу для аннотации queryset."""
+    output_field = FloatField()
+
+    def __init__(self, template, match):
+        super().__init__(F('pk'), template=template)
+        self.match = match
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, **extra_context)
+        return sql, (*self.match, *params)
+
+
+class SearchBackend:
+    """Индекс для СУБД без полнотекстового поиска: таблицы нет,
+       рецепты ищутся по вхождению всех слов запроса в название.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create(self):
+        pass
+
+    def drop(self):
+        pass
+
+    def update(self, recipe_ids=None):
+        pass
+
+    def remove(self, recipe_ids):
+        pass
+
+    def search(self, queryset, words):
+        for word in words:
+            queryset = queryset.filter(name__icontains=word)
+        return queryset.annotate(search_rank=Value(0.0, FloatField()))
+
+    def execute(self, *statements):
+        with self.connection.cursor() as cursor:
+            for statement in statements:
+                if isinstance(statement, str):
+                    statement = (statement, ())
+                cursor.execute(*statement)
+
+    @staticmethod
+    def get_id_filter(recipe_ids, column):
+        if recipe_ids is None:
+            return '', ()
+        recipe_ids = tuple(recipe_ids)
+        placeholders = ', '.join(['%s'] * len(recipe_ids)) or 'NULL'
+        return f' WHERE {column} IN ({placeholders})', recipe_ids
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector с весами: название - A, ингредиенты - B, описание - C."""
+
+    def create(self):
+        self.execute(
+            f'CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ('
+            f'recipe_id bigint PRIMARY KEY REFERENCES '
+            f'{Recipe._meta.db_table} (id) ON DELETE CASCADE '
+            f'DEFERRABLE INITIALLY DEFERRED, '
+            f'document tsvector NOT NULL)',
+            f'CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document '
+            f'ON {INDEX_TABLE} USING gin (document)',
+        )
+
+    def drop(self):
+        self.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    def update(self, recipe_ids=None):
+        where, params = self.get_id_filter(recipe_ids, 'd.id')
+        document = get_document_sql().format(
+            aggregate="string_agg(i.name, ' ')"
+        )
+        self.execute((
+            f'INSERT INTO {INDEX_TABLE} (recipe_id, document) '
+            f"SELECT d.id, setweight(to_tsvector(%s, d.name), 'A') || "
+            f"setweight(to_tsvector(%s, d.ingredients), 'B') || "
+            f"setweight(to_tsvector(%s, d.text), 'C') "
+            f'FROM ({document}) d{where} '
+            f'ON CONFLICT (recipe_id) DO UPDATE '
+            f'SET document = EXCLUDED.document',
+            (RECIPE_SEARCH_CONFIG,) * 3 + params,
+        ))
+
+    def remove(self, recipe_ids):
+        where, params = self.get_id_filter(recipe_ids, 'recipe_id')
+        self.execute((f'DELETE FROM {INDEX_TABLE}{where}', params))
+
+    def search(self, queryset, words):
+        # Каждое слово ищется по префиксу, все слова обязательны.
+        match = (
+            RECIPE_SEARCH_CONFIG, ' & '.join(f'{word}:*' for word in words)
+        )
+        return queryset.annotate(search_rank=SearchRank(
+            f'(SELECT ts_rank(document, to_tsquery(%%s, %%s)) '
+            f'FROM {INDEX_TABLE} WHERE recipe_id = %(expressions)s)',
+            match,
+        )).filter(pk__in=RawSQL(
+            f'SELECT recipe_id FROM {INDEX_TABLE} '
+            f'WHERE document @@ to_tsquery(%s, %s)',
+            match,
+        ))
+
+
+class SqliteSearchBackend(SearchBackend):
+    """FTS5 с ранжированием bm25, веса столбцов: название 10,
+       описание 1, ингредиенты 5. rowid строки индекса - id рецепта.
+    """
+    weights = (10.0, 1.0, 5.0)
+
+    def create(self):
+        self.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} '
+            f'USING fts5(name, text, ingredients, '
+            f"tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop(self):
+        self.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    def update(self, recipe_ids=None):
+        where, params = self.get_id_filter(recipe_ids, 'd.id')
+        document = get_document_sql().format(
+            aggregate="group_concat(i.name, ' ')"
+        )
+        self.remove(recipe_ids)
+        self.execute((
+            f'INSERT INTO {INDEX_TABLE} (rowid, name, text, ingredients) '
+            f'SELECT d.id, d.name, d.text, d.ingredients '
+            f'FROM ({document}) d{where}',
+            params,
+        ))
+
+    def remove(self, recipe_ids):
+        where, params = self.get_id_filter(recipe_ids, 'rowid')
+        self.execute((f'DELETE FROM {INDEX_TABLE}{where}', params))
+
+    def search(self, queryset, words):
+        # Слова в кавычках, чтобы запрос не разбирался как синтаксис FTS5.
+        match = (' '.join(f'"{word}"*' for word in words),)
+        weights = ', '.join(map(str, self.weights))
+        # bm25 тем меньше, чем документ релевантнее.
+        return queryset.annotate(search_rank=SearchRank(
+            f'(SELECT -bm25({INDEX_TABLE}, {weights}) FROM {INDEX_TABLE} '
+            f'WHERE {INDEX_TABLE} MATCH %%s AND rowid = %(expressions)s)',
+            match,
+        )).filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s',
+            match,
+        ))
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SqliteSearchBackend,
+}
+
+
+def get_backend(connection=None):
+    connection = connection or default_connection
+    return BACKENDS.get(connection.vendor, SearchBackend)(connection)
+
+
+def search_recipes(queryset, query):
+    """Рецепты, в которых встречаются все слова запроса,
+       по убыванию релевантности.
+    """
+    words = get_words(query)
+    if not words:
+        return queryset.none()
+    return get_backend().search(queryset, words).order_by(
+        F('search_rank').desc(nulls_last=True), '-id'
+    )
+
+
+def update_recipes(recipe_ids=None):
+    """Пересобирает документы рецептов, None - всех."""
+    get_backend().update(recipe_ids)
+
+
+def remove_recipes(recipe_ids):
+    get_backend().remove(recipe_ids)
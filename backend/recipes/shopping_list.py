@@ -0,0 +1,172 @@
+"""Поддержка денормализованного списка покупок ShoppingListItem.
+Добавление и удаление рецепта из корзины меняет суммы инкрементально,
+изменение ингредиентов рецепта меняет суммы на разницу составов
+у пользователей, у которых этот рецепт в корзине.
+"""
+from django.db import transaction
+from django.db.models import F, IntegerField, Sum
+from django.db.models.functions import Greatest
+
+from recipes.models import Cart, IngredientRecipe, ShoppingListItem
+
+
+def get_recipe_amounts(recipe_id):
+    """Количество каждого ингредиента в рецепте."""
+    return dict(
+        IngredientRecipe.objects.filter(recipe_id=recipe_id).values(
+            'ingredient_id'
+        ).annotate(total=Sum('amount')).values_list('ingredient_id', 'total')
+    )
+
+
+def get_cart_totals(user_ids=None):
+    """Суммы ингредиентов по корзинам, посчитанные заново.
+        Args:
+            user_ids (list): Пользователи, None - все.
+        Returns:
+            QuerySet: Строки с полями `user_id`, `ingredient_id`, `amount`.
+    """
+    queryset = Cart.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    return queryset.values(
+        'user_id', ingredient_id=F('recipe__ingredienttorecipe__ingredient')
+    ).filter(ingredient_id__isnull=False).annotate(
+        amount=Sum('recipe__ingredienttorecipe__amount')
+    ).order_by()
+
+
+def change_amount(delta):
+    """Выражение для UPDATE, прибавляющее `delta` к количеству.
+       Сумма могла разойтись с корзиной (bulk_create, правка в обход
+       сигналов), поэтому она не опускается ниже нуля: иначе вычитание
+       нарушает ограничение поля и удаление из корзины падает.
+    """
+    return Greatest(F('amount') + delta, 0, output_field=IntegerField())
+
+
+@transaction.atomic
+def add_recipe(user_id, recipe_id):
+    """Прибавляет ингредиенты рецепта к списку покупок пользователя.
+       Недостающие строки сначала создаются с нулём, затем все суммы
+       увеличиваются одним UPDATE на ингредиент, поэтому параллельные
+       добавления не теряют друг друга.
+    """
+    amounts = get_recipe_amounts(recipe_id)
+    ShoppingListItem.objects.bulk_create(
+        [
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+            for ingredient_id in amounts
+        ],
+        ignore_conflicts=True,
+    )
+    for ingredient_id, amount in amounts.items():
+        ShoppingListItem.objects.filter(
+            user_id=user_id, ingredient_id=ingredient_id
+        ).update(amount=F('amount') + amount)
+
+
+@transaction.atomic
+def remove_recipe(user_id, recipe_id):
+    """Вычитает ингредиенты рецепта из списка покупок пользователя."""
+    amounts = get_recipe_amounts(recipe_id)
+    for ingredient_id, amount in amounts.items():
+        ShoppingListItem.objects.filter(
+            user_id=user_id, ingredient_id=ingredient_id
+        ).update(amount=change_amount(-amount))
+    ShoppingListItem.objects.filter(
+        user_id=user_id, ingredient_id__in=amounts, amount=0
+    ).delete()
+
+
+@transaction.atomic
+def rebuild(user_ids=None):
+    """Пересобирает списки покупок из корзин.
+        Args:
+            user_ids (list): Пользователи, None - все.
+    """
+    items = ShoppingListItem.objects.all()
+    if user_ids is not None:
+        items = items.filter(user_id__in=user_ids)
+    items.delete()
+    ShoppingListItem.objects.bulk_create(
+        (ShoppingListItem(**row) for row in get_cart_totals(user_ids)),
+        batch_size=1000,
+    )
+
+
+@transaction.atomic
+def change_recipe(recipe_id, old_amounts):
+    """Применяет к спискам покупок изменение состава рецепта.
+       Меняются только строки ингредиентов, количество которых
+       изменилось: одним UPDATE с F() на ингредиент для всех
+       пользователей, у которых рецепт в корзине.
+        Args:
+            recipe_id (int): Изменённый рецепт.
+            old_amounts (dict): Количества ингредиентов до изменения.
+    """
+    new_amounts = get_recipe_amounts(recipe_id)
+    deltas = {
+        ingredient_id: (
+            new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+        )
+        for ingredient_id in new_amounts.keys() | old_amounts.keys()
+    }
+    deltas = {
+        ingredient_id: delta for ingredient_id, delta in deltas.items()
+        if delta
+    }
+    if not deltas:
+        return
+    user_ids = list(
+        Cart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        )
+    )
+    if not user_ids:
+        return
+    ShoppingListItem.objects.bulk_create(
+        [
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id)
+            for ingredient_id, delta in deltas.items() if delta > 0
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    for ingredient_id, delta in deltas.items():
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id=ingredient_id
+        ).update(amount=change_amount(delta))
+    ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas, amount=0
+    ).delete()
+
+
+def rebuild_recipe_carts(recipe_id):
+    """Пересчитывает списки всех, у кого рецепт в корзине."""
+    rebuild(list(
+        Cart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        )
+    ))
+
+
+def find_inconsistent_users():
+    """Пользователи, чей список покупок расходится с корзиной."""
+    expected = {
+        (row['user_id'], row['ingredient_id']): row['amount']
+        for row in get_cart_totals()
+    }
+    actual = dict(
+        ((user_id, ingredient_id), amount)
+        for user_id, ingredient_id, amount
+        in ShoppingListItem.objects.values_list(
+            'user_id', 'ingredient_id', 'amount'
+        ).iterator()
+    )
+    return sorted({
+        key[0] for key in expected.keys() | actual.keys()
+        if expected.get(key) != actual.get(key)
+    })
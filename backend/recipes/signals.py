@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, )
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from recipes import search, shopping_list
+from recipes.models import (Cart, Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagRecipe, )
+from recipes.thumbnails import schedule_thumbnails
+
+User = get_user_model()
+
+# Отправляется после замены ингредиентов рецепта целиком
+# (bulk_create не вызывает post_save), аргументы - recipe и
+# old_amounts: количества ингредиентов до замены, если известны.
+recipe_ingredients_changed = Signal()
+
+
+def touch_recipes(recipes):
+    """Обновляет время изменения рецептов без вызова их сигналов."""
+    recipes.update(modified=timezone.now())
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipe)
+@receiver((post_save, post_delete), sender=TagRecipe)
+def touch_related_recipe(instance, **kwargs):
+    touch_recipes(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def touch_tagged_recipes(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        touch_recipes(Recipe.objects.filter(pk=instance.pk))
+    elif pk_set:
+        touch_recipes(Recipe.objects.filter(pk__in=pk_set))
+    else:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Tag)
+def touch_recipes_with_tag(instance, created, **kwargs):
+    if created:
+        return
+    touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_recipes_with_ingredient(instance, created, **kwargs):
+    if created:
+        return
+    recipes = Recipe.objects.filter(ingredients=instance)
+    touch_recipes(recipes)
+    search.update_recipes(recipes.values_list('id', flat=True).distinct())
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(instance, created, update_fields=None, **kwargs):
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    touch_recipes(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Recipe)
+def make_recipe_thumbnails(instance, **kwargs):
+    if instance.image:
+        schedule_thumbnails(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(instance, **kwargs):
+    search.update_recipes((instance.id,))
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_index(instance, **kwargs):
+    search.remove_recipes((instance.id,))
+
+
+@receiver(post_save, sender=Cart)
+def add_to_shopping_list(instance, created, **kwargs):
+    if created:
+        shopping_list.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=Cart)
+def remove_from_shopping_list(instance, **kwargs):
+    # pre_delete: при удалении рецепта его ингредиенты ещё на месте.
+    shopping_list.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(recipe_ingredients_changed)
+def update_shopping_lists(recipe, old_amounts=None, **kwargs):
+    if old_amounts is None:
+        shopping_list.rebuild_recipe_carts(recipe.id)
+    else:
+        shopping_list.change_recipe(recipe.id, old_amounts)
+
+
+@receiver(recipe_ingredients_changed)
+def index_recipe_ingredients(recipe, **kwargs):
+    search.update_recipes((recipe.id,))
@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по SHA-256 их содержимого.
+       Файл `recipes/image/x.png` сохраняется как
+       `recipes/image/ab/abcdef....png`. Повторная загрузка той же
+       картинки не пишет новый файл, а возвращает имя существующего,
+       поэтому содержимое по URL никогда не меняется и его можно
+       кэшировать навсегда. Неиспользуемые файлы удаляет команда
+       `collect_media_garbage`.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    @staticmethod
+    def get_hashed_name(name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], f'{digest}{extension}')
+
+
+recipe_image_storage = ContentHashStorage()
@@ -0,0 +1,177 @@
+import hashlib
+import logging
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+from multiprocessing import get_context
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from foodgram.settings import (THUMBNAIL_FORMATS, THUMBNAIL_QUALITY,
+                               THUMBNAIL_VARIANTS, THUMBNAIL_WORKERS, )
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = 'recipes/thumbs'
+FILE_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+_executor = None
+
+# Отправляется, когда копии изображения созданы и рецепты
+# с ним отмечены, аргумент - name.
+thumbnails_ready = Signal()
+
+
+def get_storage():
+    from recipes.models import Recipe
+    return Recipe._meta.get_field('image').storage
+
+
+# Копии пишутся под детерминированными именами мимо хэширующего
+# хранилища оригиналов: имя оригинала уже задаёт их содержимое.
+thumbnail_storage = default_storage
+
+
+def get_thumbnail_name(name, variant, image_format):
+    """Имя файла уменьшенной копии.
+       Содержит имя оригинала, вариант и хэш размера, качества
+       и формата копии: имя определяет содержимое файла, поэтому копии
+       можно отдавать как неизменяемые, а смена настроек даёт новые
+       имена. Повторная генерация не создаёт новых файлов.
+        Args:
+            name (str): Имя оригинала в хранилище.
+            variant (str): Вариант из THUMBNAIL_VARIANTS.
+            image_format (str): Формат из THUMBNAIL_FORMATS.
+    """
+    stem = os.path.splitext(os.path.basename(name))[0]
+    settings_digest = hashlib.md5(
+        f'{THUMBNAIL_VARIANTS[variant]}:{THUMBNAIL_QUALITY}:{image_format}'
+        .encode()
+    ).hexdigest()[:8]
+    extension = FILE_EXTENSIONS[image_format]
+    return f'{THUMBNAIL_DIR}/{stem}.{variant}.{settings_digest}.{extension}'
+
+
+def get_thumbnail_names(name):
+    """Имена всех уменьшенных копий изображения при текущих настройках."""
+    return [
+        get_thumbnail_name(name, variant, image_format)
+        for variant in THUMBNAIL_VARIANTS
+        for image_format in THUMBNAIL_FORMATS
+    ]
+
+
+def get_thumbnails_version(name):
+    """Версия копий изображения: хэш имени оригинала и настроек копий.
+       Меняется вместе с изображением рецепта и с настройками.
+    """
+    return hashlib.md5(
+        f'{name}:{THUMBNAIL_VARIANTS}:{THUMBNAIL_FORMATS}:'
+        f'{THUMBNAIL_QUALITY}'.encode()
+    ).hexdigest()
+
+
+def mark_thumbnails_ready(name):
+    """Отмечает рецепты с изображением `name`: все копии созданы.
+       Время изменения рецептов сдвигается, чтобы ETag и кэши ответов
+       с прежними ссылками на оригинал стали недействительны.
+    """
+    from recipes.models import Recipe
+    version = get_thumbnails_version(name)
+    updated = Recipe.objects.filter(image=name).exclude(
+        thumbnails_version=version
+    ).update(thumbnails_version=version, modified=timezone.now())
+    if updated:
+        thumbnails_ready.send(sender=Recipe, name=name)
+
+
+def generate_thumbnails(name, force=False):
+    """Создаёт все уменьшенные копии изображения.
+        Args:
+            name (str): Имя оригинала в хранилище.
+            force (bool): Пересоздать уже существующие копии.
+        Returns:
+            int: Количество созданных файлов.
+    """
+    storage = thumbnail_storage
+    targets = [
+        (variant, size, image_format,
+         get_thumbnail_name(name, variant, image_format))
+        for variant, size in THUMBNAIL_VARIANTS.items()
+        for image_format in THUMBNAIL_FORMATS
+    ]
+    if not force:
+        targets = [
+            target for target in targets if not storage.exists(target[-1])
+        ]
+    if not targets:
+        mark_thumbnails_ready(name)
+        return 0
+    with get_storage().open(name) as original, Image.open(original) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+    for variant, size, image_format, target in targets:
+        thumbnail = image.copy()
+        thumbnail.thumbnail(size, Image.LANCZOS)
+        output = BytesIO()
+        thumbnail.save(
+            output, format=image_format, quality=THUMBNAIL_QUALITY
+        )
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(output.getvalue()))
+    mark_thumbnails_ready(name)
+    return len(targets)
+
+
+def get_executor():
+    """Пул процессов для генерации копий, создаётся при первом вызове.
+       Процессы запускаются через spawn и настраивают Django сами,
+       чтобы не копировать состояние потоков веб-сервера.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=THUMBNAIL_WORKERS,
+            mp_context=get_context('spawn'),
+            initializer=django.setup,
+        )
+    return _executor
+
+
+def log_failure(future):
+    if future.exception() is not None:
+        logger.error(
+            'Не удалось создать уменьшенные копии изображения',
+            exc_info=future.exception(),
+        )
+
+
+def submit_thumbnails(name, force=False):
+    """Запускает генерацию копий в пуле процессов, а при
+       THUMBNAIL_WORKERS = 0 - сразу в этом процессе.
+        Returns:
+            Future: Результат generate_thumbnails или его исключение.
+    """
+    if THUMBNAIL_WORKERS:
+        return get_executor().submit(generate_thumbnails, name, force)
+    future = Future()
+    try:
+        future.set_result(generate_thumbnails(name, force))
+    except Exception as error:
+        # Битое или слишком большое изображение (DecompressionBombError,
+        # ValueError) не должно ронять запрос или команду.
+        future.set_exception(error)
+    return future
+
+
+def schedule_thumbnails(name):
+    """Ставит генерацию копий в очередь после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: submit_thumbnails(name).add_done_callback(log_failure)
+    )